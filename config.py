@@ -1,5 +1,6 @@
 CONFIG = {
     "interaction_model": "barnes_hut",
+    "fmm_order": 4,
     "physics": {'gravity': True, 'electromagnetism': False, 'dark_matter': True, 'fluid_dynamics': True, 'relativity': False},
     "gpu_mode": True,
     "particle_count": 100000,
@@ -8,4 +9,22 @@ CONFIG = {
     "integration_method": "verlet",
     "timestep": 0.01,
     "preset": "solar_system",
+    "renderer": "pygame",
+    "threaded_physics": False,
+    "monitor_interval": 0.5,
+    "step_log": None,
+    "step_log_every": 1,
+    "log_energy": False,
+    "jit_warmup": True,
+    "trajectory": None,
+    "trajectory_every": 1,
+    "trajectory_stride": 1,
+    "trajectory_dtype": "float32",
+    "checkpoint_every": 0,
+    "checkpoint_dir": "checkpoints",
+    "checkpoint_keep": 3,
+    "resume_from": None,
+    "playback_path": None,
+    "playback_rate": 30.0,
+    "playback_interpolation": "hermite",
 }
@@ -0,0 +1,112 @@
+import torch
+from core.interaction_model import select_model
+from core.physics_engine.pairwise import inverse_square_sum
+from core.physics_engine.dark_matter import compute_dark_matter_forces
+from core.physics_engine.fluid_dynamics import compute_fluid_dynamics
+from core.physics_engine.general_relativity import apply_relativity_corrections
+from core.presets import preset_physics
+
+G = 6.67430e-11
+K_COULOMB = 8.9875517923e9
+DEFAULT_PHYSICS = {"gravity": True, "electromagnetism": False, "dark_matter": False, "fluid_dynamics": False, "relativity": False}
+
+
+def _fused_long_range(particles, gravity, electromagnetism, targets=None):
+    """
+    Gravity and Coulomb forces from one batched pair pass: displacements and
+    distances are computed once and weighted by mass and charge together.
+    """
+    pos = particles["pos"]
+    mass = particles["mass"].reshape(-1)
+    charge = particles.get("charge", None)
+    channels = []
+    if gravity:
+        channels.append(mass)
+    if electromagnetism and charge is not None:
+        charge = charge.reshape(-1).to(pos.dtype)
+        channels.append(charge)
+    num_targets = pos.shape[0] if targets is None else targets.shape[0]
+    forces = torch.zeros((num_targets, 3), dtype=pos.dtype, device=pos.device)
+    if not channels:
+        return forces
+    field = inverse_square_sum(pos, torch.stack(channels, dim=1), targets=targets)
+    if gravity:
+        target_mass = mass if targets is None else mass[targets]
+        forces += G * target_mass.unsqueeze(1) * field[:, 0]
+    if electromagnetism and charge is not None:
+        target_charge = charge if targets is None else charge[targets]
+        forces -= K_COULOMB * target_charge.unsqueeze(1) * field[:, -1]
+    return forces
+
+
+def _select(forces, targets):
+    return forces if targets is None else forces[targets]
+
+
+def build_force_pipeline(config):
+    """
+    Compose the physics modules enabled in config["physics"] into one force model.
+    The preset's own "physics" entries take precedence, so body presets such
+    as solar_system run without the galactic halo and SPH terms.
+    Gravity uses the configured interaction model; with "direct" it is fused
+    with the Coulomb term in a single pair pass. Dark matter and SPH are added
+    on top and the relativity correction is applied as the last stage.
+    physics["sph"] (a dict, e.g. from the preset) holds the keyword
+    arguments of compute_fluid_dynamics: h, rho0, k, mu; without h the
+    smoothing length follows the particle spacing.
+    Every stage restricts its work to the targets when given: the tree and
+    FMM models walk only the target sinks (their trees are still built from
+    all particles), so block timesteps save work with any interaction model.
+    Args:
+        config (dict): Simulation configuration.
+    Returns:
+        callable: model_fn(particles, targets=None) -> forces on all particles,
+        or on the given target indices only.
+    """
+    physics = dict(DEFAULT_PHYSICS)
+    physics.update(config.get("physics", {}))
+    physics.update(preset_physics(config.get("preset", None)))
+    model_name = config.get("interaction_model", "direct")
+    sph = dict(physics.get("sph", None) or {})
+    fuse = model_name == "direct"
+    gravity_fn = select_model(model_name, config) if physics["gravity"] and not fuse else None
+
+    def model_fn(particles, targets=None):
+        if fuse:
+            forces = _fused_long_range(particles, physics["gravity"], physics["electromagnetism"], targets)
+        else:
+            if gravity_fn is not None:
+                forces = gravity_fn(particles, targets=targets)
+            else:
+                forces = torch.zeros_like(_select(particles["pos"], targets))
+            if physics["electromagnetism"] and "charge" in particles:
+                forces = forces + _fused_long_range(particles, False, True, targets)
+        if physics["dark_matter"]:
+            forces += compute_dark_matter_forces(particles, targets=targets)
+        if physics["fluid_dynamics"]:
+            forces += compute_fluid_dynamics(particles, targets=targets, **sph)
+        if physics["relativity"]:
+            forces = apply_relativity_corrections({"vel": _select(particles["vel"], targets)}, forces)
+        return forces
+
+    return model_fn
+
+
+def warm_up(config, dtypes=("float32",), n=64):
+    """
+    Compile (or load from Numba's on-disk cache) every kernel the configured
+    pipeline uses, for each dtype, by evaluating it on a small random system,
+    both for all particles and for a subset of targets.
+    """
+    model_fn = build_force_pipeline(config)
+    gen = torch.Generator().manual_seed(0)
+    for dtype in dtypes:
+        dtype = getattr(torch, dtype) if isinstance(dtype, str) else dtype
+        particles = {
+            "pos": torch.randn((n, 3), generator=gen).to(dtype),
+            "vel": torch.randn((n, 3), generator=gen).to(dtype),
+            "mass": torch.rand((n, 1), generator=gen).to(dtype) + 0.5,
+            "charge": torch.randn((n, 1), generator=gen).to(dtype),
+        }
+        model_fn(particles)
+        model_fn(particles, targets=torch.arange(0, n, 2))
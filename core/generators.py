@@ -0,0 +1,148 @@
+import math
+import torch
+
+# Procedural initial conditions in SI units. Every generator builds all n
+# particles with a handful of tensor operations (no per-particle Python),
+# returns the usual particle dict (pos, vel, mass, color, charge as float32 /
+# uint8 tensors) and is reproducible for a given seed. Default sizes are
+# planetary-system scale (~1e11 m, ~1e32 kg) like the body presets: the
+# float32 direct kernels overflow r^3 beyond ~7e12 m separations.
+
+G = 6.67430e-11
+
+def _generator(seed):
+    gen = torch.Generator()
+    if seed is None:
+        gen.seed()
+    else:
+        gen.manual_seed(seed)
+    return gen
+
+def _isotropic(n, gen):
+    """n random unit vectors."""
+    cos_theta = 2 * torch.rand(n, generator=gen, dtype=torch.float64) - 1
+    phi = 2 * math.pi * torch.rand(n, generator=gen, dtype=torch.float64)
+    sin_theta = torch.sqrt(1 - cos_theta ** 2)
+    return torch.stack((sin_theta * torch.cos(phi), sin_theta * torch.sin(phi), cos_theta), dim=1)
+
+def _gradient(t, inner, outer):
+    """uint8 colors blended from inner (t=0) to outer (t>=1)."""
+    t = t.clamp(0, 1).unsqueeze(1)
+    inner = torch.tensor(inner, dtype=torch.float64)
+    outer = torch.tensor(outer, dtype=torch.float64)
+    return (inner + (outer - inner) * t).round().to(torch.uint8)
+
+def _particles(pos, vel, mass, color):
+    n = pos.shape[0]
+    return {
+        "pos": pos.to(torch.float32),
+        "vel": vel.to(torch.float32),
+        "mass": mass.to(torch.float32).reshape(n, 1),
+        "color": color,
+        "charge": torch.zeros((n, 1), dtype=torch.float32),
+    }
+
+def plummer_sphere(n, total_mass=2e32, scale_radius=1e11, max_radius=20.0, seed=None):
+    """
+    Plummer sphere in virial equilibrium (Aarseth, Henon & Wielen 1974):
+    radii from the inverse mass profile, speeds by rejection sampling of
+    the isotropic distribution function, both directions isotropic.
+    Args:
+        n (int): Number of particles.
+        total_mass (float): Cluster mass in kg (split equally).
+        scale_radius (float): Plummer radius a in m.
+        max_radius (float): Truncation radius in units of a.
+        seed (int, optional): Random seed.
+    """
+    gen = _generator(seed)
+    # Enclosed mass fraction X -> r = a / sqrt(X^(-2/3) - 1), truncated at max_radius.
+    x_max = (1 + max_radius ** -2) ** -1.5
+    x = torch.rand(n, generator=gen, dtype=torch.float64) * x_max
+    r = scale_radius / torch.sqrt(x.clamp_min(1e-12) ** (-2.0 / 3.0) - 1)
+    # q = v / v_escape with density q^2 (1 - q^2)^3.5 (maximum < 0.1), in batches.
+    q = torch.empty(0, dtype=torch.float64)
+    while q.numel() < n:
+        k = int((n - q.numel()) * 2.3) + 16
+        trial = torch.rand(k, generator=gen, dtype=torch.float64)
+        y = 0.1 * torch.rand(k, generator=gen, dtype=torch.float64)
+        q = torch.cat((q, trial[y < trial ** 2 * (1 - trial ** 2) ** 3.5]))
+    v_escape = torch.sqrt(2 * G * total_mass / torch.sqrt(r ** 2 + scale_radius ** 2))
+    pos = _isotropic(n, gen) * r.unsqueeze(1)
+    vel = _isotropic(n, gen) * (q[:n] * v_escape).unsqueeze(1)
+    mass = torch.full((n,), total_mass / max(n, 1), dtype=torch.float64)
+    return _particles(pos, vel, mass, _gradient(r / (4 * scale_radius), (255, 240, 200), (170, 190, 255)))
+
+def exponential_disk(n, disk_mass=2e32, scale_length=1e11, scale_height=1e10, central_mass=0.0,
+                     halo_v0=0.0, dispersion=0.05, seed=None):
+    """
+    Exponential disk galaxy: surface density ~ exp(-R / scale_length), sech^2
+    vertical profile, rotating on circular orbits (enclosed disk mass plus
+    central mass plus a flat halo of speed halo_v0, e.g. the dark_matter
+    model's 200 km/s) with a small random velocity dispersion.
+    Args:
+        n (int): Number of disk particles.
+        disk_mass (float): Total disk mass in kg.
+        scale_length, scale_height (float): Radial and vertical scales in m.
+        central_mass (float): Mass of a central body (added as the first particle if > 0).
+        halo_v0 (float): Flat rotation speed of the halo in m/s.
+        dispersion (float): Velocity dispersion as a fraction of the circular speed.
+        seed (int, optional): Random seed.
+    """
+    gen = _generator(seed)
+    # R ~ Gamma(2, scale_length) is exactly the exponential disk's radial distribution.
+    u = torch.rand((n, 2), generator=gen, dtype=torch.float64).clamp_min(1e-12)
+    radius = -scale_length * torch.log(u).sum(dim=1)
+    phi = 2 * math.pi * torch.rand(n, generator=gen, dtype=torch.float64)
+    z = scale_height * torch.atanh(2 * torch.rand(n, generator=gen, dtype=torch.float64).clamp(1e-9, 1 - 1e-9) - 1)
+    y = radius / scale_length
+    enclosed = central_mass + disk_mass * (1 - (1 + y) * torch.exp(-y))
+    v_circ = torch.sqrt(G * enclosed / radius + halo_v0 ** 2)
+    cos_phi, sin_phi = torch.cos(phi), torch.sin(phi)
+    pos = torch.stack((radius * cos_phi, radius * sin_phi, z), dim=1)
+    vel = torch.stack((-v_circ * sin_phi, v_circ * cos_phi, torch.zeros_like(v_circ)), dim=1)
+    vel += dispersion * v_circ.unsqueeze(1) * torch.randn((n, 3), generator=gen, dtype=torch.float64)
+    mass = torch.full((n,), disk_mass / max(n, 1), dtype=torch.float64)
+    color = _gradient(y / 4, (255, 230, 170), (140, 170, 255))
+    if central_mass > 0:
+        pos = torch.cat((torch.zeros((1, 3), dtype=torch.float64), pos))
+        vel = torch.cat((torch.zeros((1, 3), dtype=torch.float64), vel))
+        mass = torch.cat((torch.tensor([central_mass], dtype=torch.float64), mass))
+        color = torch.cat((torch.tensor([[255, 255, 255]], dtype=torch.uint8), color))
+    return _particles(pos, vel, mass, color)
+
+def protoplanetary_disk(n, star_mass=1e30, disk_mass=1e27, inner_radius=3e10, outer_radius=6e11,
+                        surface_index=1.0, aspect_ratio=0.03, seed=None):
+    """
+    Thin dust/planetesimal disk on Keplerian orbits around a star at the
+    origin (the star itself is not added; presets list it as a body).
+    Surface density ~ R^-surface_index between inner_radius and outer_radius,
+    Gaussian thickness aspect_ratio * R.
+    Args:
+        n (int): Number of disk particles.
+        star_mass (float): Mass of the central star in kg (sets the orbital speeds).
+        disk_mass (float): Total disk mass in kg.
+        inner_radius, outer_radius (float): Disk edges in m.
+        surface_index (float): Power-law index p of the surface density (p != 2).
+        aspect_ratio (float): Scale height over radius.
+        seed (int, optional): Random seed.
+    """
+    gen = _generator(seed)
+    # Inverse CDF of dN ~ R^(1-p) dR.
+    k = 2 - surface_index
+    u = torch.rand(n, generator=gen, dtype=torch.float64)
+    radius = (inner_radius ** k + u * (outer_radius ** k - inner_radius ** k)) ** (1 / k)
+    phi = 2 * math.pi * torch.rand(n, generator=gen, dtype=torch.float64)
+    z = aspect_ratio * radius * torch.randn(n, generator=gen, dtype=torch.float64)
+    v_kepler = torch.sqrt(G * star_mass / radius)
+    cos_phi, sin_phi = torch.cos(phi), torch.sin(phi)
+    pos = torch.stack((radius * cos_phi, radius * sin_phi, z), dim=1)
+    vel = torch.stack((-v_kepler * sin_phi, v_kepler * cos_phi, torch.zeros_like(v_kepler)), dim=1)
+    mass = torch.full((n,), disk_mass / max(n, 1), dtype=torch.float64)
+    t = (radius - inner_radius) / (outer_radius - inner_radius)
+    return _particles(pos, vel, mass, _gradient(t, (230, 190, 140), (150, 150, 170)))
+
+GENERATORS = {
+    "plummer": plummer_sphere,
+    "exponential_disk": exponential_disk,
+    "protoplanetary_disk": protoplanetary_disk,
+}
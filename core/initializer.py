@@ -1,13 +1,16 @@
-import numpy as np
 import torch
-import json
-import sys
-import os
+from core.presets import load_preset
+
+def simulation_device(config):
+    """CUDA with gpu_mode (when available), else the CPU."""
+    return torch.device("cuda" if config.get("gpu_mode", False) and torch.cuda.is_available() else "cpu")
 
 def initialize_particles(config):
-    # Always start with a blank simulation (no objects)
-    device = torch.device("cuda" if config.get("gpu_mode", False) and torch.cuda.is_available() else "cpu")
-    pos = torch.empty((0, 3), dtype=torch.float32, device=device)
-    vel = torch.empty((0, 3), dtype=torch.float32, device=device)
-    mass = torch.empty((0, 1), dtype=torch.float32, device=device)
-    return {"pos": pos, "vel": vel, "mass": mass}
\ No newline at end of file
+    """
+    Initial particles of config["preset"] (see core.presets): JSON bodies,
+    bulk .npz / .npy arrays and procedural generators, which build
+    config["particle_count"] particles. Unknown or missing presets start empty.
+    """
+    device = simulation_device(config)
+    particles = load_preset(config.get("preset", None), config.get("particle_count", 0), config.get("seed", None))
+    return {key: value.to(device) for key, value in particles.items()}
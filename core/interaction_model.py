@@ -1,9 +1,17 @@
-from core.physics_engine import gravity, barnes_hut
+from functools import partial
+from core.physics_engine import gravity, barnes_hut, fmm
 
 
-def select_model(model_name):
+def select_model(model_name, config=None):
+    config = config or {}
     if model_name == "barnes_hut":
         return barnes_hut.compute_barnes_hut_forces
+    elif model_name == "barnes_hut_group":
+        return barnes_hut.compute_barnes_hut_group_forces
+    elif model_name == "direct_tiled":
+        return gravity.compute_direct_gravity_tiled
+    elif model_name == "fmm":
+        return partial(fmm.compute_fmm_forces, order=config.get("fmm_order", 4))
     else:
         return gravity.compute_gravity_forces
 
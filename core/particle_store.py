@@ -0,0 +1,208 @@
+import numpy as np
+import torch
+from collections.abc import MutableMapping
+
+# Integrator state that is only valid for the current set of particles.
+INTEGRATOR_HISTORY = ("prev_pos", "next_forces", "dt_bin")
+
+# Keys holding one row per particle; everything else is stored as is.
+PARTICLE_FIELDS = frozenset(("pos", "vel", "mass", "color", "charge", "names", "size") + INTEGRATOR_HISTORY)
+
+# Value given to a per-particle field when a row is added without it.
+FIELD_DEFAULTS = {"mass": 1.0, "color": 255}
+# dtype of a field created by add_many (floats otherwise follow pos).
+FIELD_DTYPES = {"color": torch.uint8, "dt_bin": torch.int64}
+
+_MIN_CAPACITY = 16
+
+
+def _is_array(value):
+    return isinstance(value, (torch.Tensor, np.ndarray))
+
+
+def _is_view(buf, value):
+    """True if value is buf's own leading rows (what __getitem__ returns)."""
+    if isinstance(buf, torch.Tensor):
+        return value.data_ptr() == buf.data_ptr() and value.stride() == buf.stride()
+    return (value.__array_interface__["data"][0] == buf.__array_interface__["data"][0]
+            and value.strides == buf.strides)
+
+
+class ParticleStore(MutableMapping):
+    """
+    Particle state kept in preallocated buffers that grow by doubling.
+    Behaves like the particles dict used everywhere else: particles["pos"]
+    is a view of the first count rows of the pos buffer, so integrators and
+    force models work on it unchanged. Assigning an array with one row per
+    particle to one of PARTICLE_FIELDS (or a field add_many created) copies
+    it into the field's buffer, unless it already is that buffer's view;
+    anything else is stored as is. names are kept as a numpy object array.
+    Adding particles is amortized O(1) per particle, removing swaps the last
+    particles into the freed rows, and both drop INTEGRATOR_HISTORY.
+    """
+
+    def __init__(self, particles=None, capacity=0):
+        self._buffers = {}
+        self._extra = {}
+        self.count = 0
+        self.capacity = 0
+        particles = dict(particles or {})
+        if "pos" in particles:
+            self.count = particles["pos"].shape[0]
+        self._reserve(max(capacity, self.count))
+        for key, value in particles.items():
+            self[key] = value
+
+    @classmethod
+    def wrap(cls, fields, extra=None):
+        """
+        Store that uses the given arrays (one row per particle, all the same
+        length) as its buffers without copying them, e.g. memory-mapped
+        checkpoint data. The first add_many moves them into grown buffers.
+        """
+        store = cls()
+        store._buffers = dict(fields)
+        store._extra = dict(extra or {})
+        store.count = store.capacity = next(iter(store._buffers.values())).shape[0] if store._buffers else 0
+        return store
+
+    def _is_field(self, key, value):
+        if key not in PARTICLE_FIELDS and key not in self._buffers:
+            return False
+        if isinstance(value, (list, tuple)) and len(value) == self.count:
+            return True
+        return _is_array(value) and value.ndim > 0 and value.shape[0] == self.count
+
+    def _allocate(self, like, capacity):
+        if isinstance(like, torch.Tensor):
+            return torch.empty((capacity,) + tuple(like.shape[1:]), dtype=like.dtype, device=like.device)
+        return np.empty((capacity,) + like.shape[1:], dtype=like.dtype)
+
+    def _reserve(self, needed):
+        """Grow every buffer to hold at least needed particles."""
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, 2 * self.capacity, _MIN_CAPACITY)
+        for key, buf in self._buffers.items():
+            grown = self._allocate(buf, capacity)
+            grown[:self.count] = buf[:self.count]
+            self._buffers[key] = grown
+        self.capacity = capacity
+
+    def __getitem__(self, key):
+        if key in self._buffers:
+            return self._buffers[key][:self.count]
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if not self._is_field(key, value):
+            self._buffers.pop(key, None)
+            self._extra[key] = value
+            return
+        if not _is_array(value):
+            value = np.array(value, dtype=object)
+        self._extra.pop(key, None)
+        buf = self._buffers.get(key, None)
+        if (buf is None or type(buf) is not type(value) or buf.dtype != value.dtype
+                or buf.shape[1:] != value.shape[1:]
+                or (isinstance(buf, torch.Tensor) and buf.device != value.device)):
+            buf = self._allocate(value, self.capacity)
+            self._buffers[key] = buf
+        elif _is_view(buf, value):
+            return  # in-place update of particles[key], e.g. particles["vel"] += dv
+        buf[:self.count] = value
+
+    def __delitem__(self, key):
+        if key in self._buffers:
+            del self._buffers[key]
+        else:
+            del self._extra[key]
+
+    def __iter__(self):
+        yield from self._buffers
+        yield from self._extra
+
+    def __len__(self):
+        return len(self._buffers) + len(self._extra)
+
+    def _fill(self, key, buf, start, stop, value):
+        if value is None:
+            if key == "names":
+                value = [f"Particle_{i}" for i in range(start, stop)]
+            else:
+                value = FIELD_DEFAULTS.get(key, 0)
+        if isinstance(buf, torch.Tensor):
+            value = torch.as_tensor(value, dtype=buf.dtype, device=buf.device)
+            buf[start:stop] = value.reshape((-1,) + tuple(buf.shape[1:])) if value.dim() else value
+        else:
+            buf[start:stop] = value
+
+    def _create_field(self, key, value, k):
+        """Buffer for a field first given to add_many; existing rows get the default."""
+        pos_buf = self._buffers["pos"]
+        if key == "names":
+            buf = np.empty(self.capacity, dtype=object)
+        else:
+            value = torch.as_tensor(value, device=pos_buf.device).reshape(k, -1)
+            dtype = FIELD_DTYPES.get(key, pos_buf.dtype if value.is_floating_point() else value.dtype)
+            buf = torch.empty((self.capacity, value.shape[1]), dtype=dtype, device=pos_buf.device)
+        self._fill(key, buf, 0, self.count, None)
+        self._buffers[key] = buf
+
+    def add_many(self, pos, vel=None, mass=None, **fields):
+        """
+        Append len(pos) particles. Fields that are not given get their
+        default (zeros, mass 1, white, "Particle_<i>"); a keyword field the
+        store does not have yet is created, with the default for the
+        existing particles.
+        Returns:
+            torch.Tensor: Indices of the new particles.
+        """
+        if "pos" not in self._buffers:
+            raise KeyError("ParticleStore needs a pos field before particles can be added")
+        pos_buf = self._buffers["pos"]
+        pos = torch.as_tensor(pos, dtype=pos_buf.dtype, device=pos_buf.device).reshape(-1, 3)
+        k = pos.shape[0]
+        fields.update(pos=pos, vel=vel, mass=mass)
+        start = self.count
+        self._reserve(start + k)
+        for key, value in fields.items():
+            if value is not None and key not in self._buffers:
+                self._create_field(key, value, k)
+        for key, buf in self._buffers.items():
+            self._fill(key, buf, start, start + k, fields.get(key, None))
+        self.count = start + k
+        self._drop_history()
+        return torch.arange(start, start + k, device=pos_buf.device)
+
+    def remove_many(self, indices):
+        """
+        Remove the given particles by moving the last particles into their
+        rows; the order of the remaining particles is not preserved.
+        """
+        indices = torch.as_tensor(indices, dtype=torch.int64).reshape(-1).cpu()
+        indices = indices[(indices >= 0) & (indices < self.count)].unique()
+        if indices.numel() == 0:
+            return
+        remaining = self.count - indices.numel()
+        keep = torch.ones(self.count, dtype=torch.bool)
+        keep[indices] = False
+        holes = indices[indices < remaining]
+        movers = torch.nonzero(keep[remaining:]).flatten() + remaining
+        for key, buf in self._buffers.items():
+            if isinstance(buf, torch.Tensor):
+                buf[holes.to(buf.device)] = buf[movers.to(buf.device)]
+            else:
+                buf[holes.numpy()] = buf[movers.numpy()]
+        self.count = remaining
+        self._drop_history()
+
+    def _drop_history(self):
+        for key in INTEGRATOR_HISTORY:
+            self.pop(key, None)
+
+    def to_dict(self):
+        """Plain dict of independent copies, e.g. for saving."""
+        return {key: value.clone() if isinstance(value, torch.Tensor) else
+                value.copy() if isinstance(value, np.ndarray) else value
+                for key, value in self.items()}
@@ -1,87 +1,252 @@
 import torch
+import numpy as np
+from numba import njit, prange
+from core.physics_engine.octree import build_octree, MAX_LEVEL
+from utils.profiler import timed
 
-class OctreeNode:
-    def __init__(self, center, half_size, indices):
-        self.center = center
-        self.half_size = half_size
-        self.indices = indices
-        self.children = []
-        self.mass = 0.0
-        self.mass_center = torch.zeros(3)
+# Targets walked by one thread with a shared traversal stack.
+_BLOCK = 64
+# A depth-first walk keeps at most 7 siblings per level on the stack.
+_STACK_SIZE = 8 * (MAX_LEVEL + 1)
 
-    def is_leaf(self):
-        return len(self.children) == 0
 
-def build_octree(pos, indices, center, half_size, max_particles=1):
-    if len(indices) <= max_particles:
-        return OctreeNode(center, half_size, indices)
-    node = OctreeNode(center, half_size, indices)
-    # Fix for device mismatch error: ensure all tensors are created on the same device as pos
-    # In build_octree and all force calculations, always use pos.device for new tensors
-    offsets = torch.tensor([[dx, dy, dz] for dx in [-0.5, 0.5] for dy in [-0.5, 0.5] for dz in [-0.5, 0.5]], device=center.device, dtype=center.dtype)
-    for offset in offsets:
-        child_center = center + offset * half_size
-        mask = ((pos[indices] >= (child_center - half_size/2)) & (pos[indices] < (child_center + half_size/2))).all(dim=1)
-        child_indices = [indices[i] for i, m in enumerate(mask) if m]
-        if child_indices:
-            child = build_octree(pos, child_indices, child_center, half_size/2, max_particles)
-            node.children.append(child)
-    return node
+@njit(parallel=True, nogil=True, cache=True)
+def _barnes_hut_walk(pos, mass, node_start, node_count, node_half, node_mass, node_com,
+                     child_first, child_count, sinks, theta, G, eps):
+    n = sinks.size
+    forces = np.zeros((n, 3))
+    num_blocks = (n + _BLOCK - 1) // _BLOCK
+    for b in prange(num_blocks):
+        stack = np.empty(_STACK_SIZE, dtype=np.int64)
+        for k in range(b * _BLOCK, min((b + 1) * _BLOCK, n)):
+            i = sinks[k]
+            xi = pos[i, 0]
+            yi = pos[i, 1]
+            zi = pos[i, 2]
+            fx = 0.0
+            fy = 0.0
+            fz = 0.0
+            stack[0] = 0
+            top = 1
+            while top > 0:
+                top -= 1
+                node = stack[top]
+                if child_count[node] == 0:
+                    start = node_start[node]
+                    for j in range(start, start + node_count[node]):
+                        if j != i:
+                            dx = pos[j, 0] - xi
+                            dy = pos[j, 1] - yi
+                            dz = pos[j, 2] - zi
+                            dist = np.sqrt(dx * dx + dy * dy + dz * dz) + eps
+                            s = mass[j] / (dist * dist * dist)
+                            fx += s * dx
+                            fy += s * dy
+                            fz += s * dz
+                    continue
+                dx = node_com[node, 0] - xi
+                dy = node_com[node, 1] - yi
+                dz = node_com[node, 2] - zi
+                d = np.sqrt(dx * dx + dy * dy + dz * dz)
+                if 2.0 * node_half[node] < theta * d:
+                    dist = d + eps
+                    s = node_mass[node] / (dist * dist * dist)
+                    fx += s * dx
+                    fy += s * dy
+                    fz += s * dz
+                else:
+                    first = child_first[node]
+                    for c in range(first, first + child_count[node]):
+                        stack[top] = c
+                        top += 1
+            scale = G * mass[i]
+            forces[k, 0] = scale * fx
+            forces[k, 1] = scale * fy
+            forces[k, 2] = scale * fz
+    return forces
 
-def compute_mass(node, pos, mass):
-    if node.is_leaf():
-        node.mass = mass[node.indices].sum()
-        if node.mass > 0:
-            node.mass_center = (pos[node.indices] * mass[node.indices]).sum(dim=0) / node.mass
-        else:
-            node.mass_center = torch.zeros(3)
-    else:
-        node.mass = 0.0
-        node.mass_center = torch.zeros(3)
-        for child in node.children:
-            compute_mass(child, pos, mass)
-            node.mass += child.mass
-            node.mass_center += child.mass * child.mass_center
-        if node.mass > 0:
-            node.mass_center /= node.mass
 
-def barnes_hut_force(node, pos, mass, i, theta=0.5, G=6.67430e-11):
-    if node.is_leaf():
-        f = torch.zeros(3)
-        for j in node.indices:
-            if i != j:
-                diff = pos[j] - pos[i]
-                dist = torch.norm(diff) + 1e-5
-                f += G * mass[i] * mass[j] * diff / (dist ** 3)
-        return f
-    else:
-        d = torch.norm(node.mass_center - pos[i])
-        s = node.half_size * 2
-        if s / d < theta:
-            diff = node.mass_center - pos[i]
-            dist = torch.norm(diff) + 1e-5
-            return G * mass[i] * node.mass * diff / (dist ** 3)
-        else:
-            f = torch.zeros(3)
-            for child in node.children:
-                f += barnes_hut_force(child, pos, mass, i, theta, G)
-            return f
+def _sorted_targets(tree, targets):
+    """Tree (Morton) positions of the target indices, and the order that sorts them."""
+    rank = np.empty_like(tree["order"])
+    rank[tree["order"]] = np.arange(rank.size)
+    sinks = rank[np.asarray(targets.detach().cpu().numpy(), dtype=np.int64)]
+    perm = np.argsort(sinks, kind="stable")
+    return sinks, perm
 
-def compute_barnes_hut_forces(particles, theta=0.5, G=6.67430e-11):
+
+def compute_barnes_hut_forces(particles, theta=0.5, G=6.67430e-11, leaf_size=8, eps=1e-5, targets=None):
+    """
+    Barnes-Hut gravity on a linear (Morton-ordered) octree.
+    The tree is built with numpy from sorted space-filling-curve keys and all
+    particles are walked in parallel with Numba; a cell is accepted when its
+    size over the distance to its centre of mass is below theta.
+    With targets, the tree is still built from every particle but only the
+    targets are walked and their forces returned.
+    """
     pos = particles["pos"]
-    mass = particles["mass"].flatten()
     n = pos.shape[0]
     if n == 0:
         # No particles: return empty force tensor
         return torch.zeros_like(pos)
-    min_pos = pos.min(dim=0).values
-    max_pos = pos.max(dim=0).values
-    center = (min_pos + max_pos) / 2
-    half_size = (max_pos - min_pos).max() / 2 + 1e-5
-    indices = list(range(n))
-    root = build_octree(pos, indices, center, half_size)
-    compute_mass(root, pos, mass)
-    forces = torch.zeros_like(pos)
-    for i in range(n):
-        forces[i] = barnes_hut_force(root, pos, mass, i, theta, G)
+    with timed("tree_build"):
+        tree = build_octree(pos.detach().cpu().numpy(), particles["mass"].detach().cpu().numpy().reshape(-1), leaf_size)
+    if targets is None:
+        sinks = np.arange(n)
+    else:
+        # Walk the targets in tree order so neighbouring sinks share cache lines.
+        sinks, perm = _sorted_targets(tree, targets)
+        sinks = sinks[perm]
+    with timed("tree_walk"):
+        sorted_forces = _barnes_hut_walk(
+            tree["pos"], tree["mass"], tree["node_start"], tree["node_count"], tree["node_half"],
+            tree["node_mass"], tree["node_com"], tree["child_first"], tree["child_count"], sinks, theta, G, eps,
+        )
+    forces = np.empty_like(sorted_forces)
+    if targets is None:
+        forces[tree["order"]] = sorted_forces
+    else:
+        forces[perm] = sorted_forces
+    return torch.from_numpy(forces).to(dtype=pos.dtype, device=pos.device)
+
+
+@njit(cache=True)
+def _grow(buf):
+    out = np.empty(buf.size * 2, dtype=buf.dtype)
+    out[:buf.size] = buf
+    return out
+
+
+@njit(parallel=True, nogil=True, cache=True)
+def _barnes_hut_group_walk(pos, mass, node_start, node_count, node_half, node_mass, node_com,
+                           child_first, child_count, groups, active, theta, G, eps):
+    n = pos.shape[0]
+    forces = np.zeros((n, 3))
+    for g in prange(groups.size):
+        group = groups[g]
+        start = node_start[group]
+        end = start + node_count[group]
+        # Bounding sphere of the target group.
+        lo = pos[start].copy()
+        hi = pos[start].copy()
+        for i in range(start, end):
+            for k in range(3):
+                lo[k] = min(lo[k], pos[i, k])
+                hi[k] = max(hi[k], pos[i, k])
+        cx = 0.5 * (lo[0] + hi[0])
+        cy = 0.5 * (lo[1] + hi[1])
+        cz = 0.5 * (lo[2] + hi[2])
+        radius = 0.5 * np.sqrt((hi[0] - lo[0]) ** 2 + (hi[1] - lo[1]) ** 2 + (hi[2] - lo[2]) ** 2)
+
+        # One walk per group: accepted cells go to the cell list, leaves that
+        # have to be opened go to the particle (leaf) list.
+        cells = np.empty(256, dtype=np.int64)
+        leaves = np.empty(64, dtype=np.int64)
+        num_cells = 0
+        num_leaves = 0
+        stack = np.empty(_STACK_SIZE, dtype=np.int64)
+        stack[0] = 0
+        top = 1
+        while top > 0:
+            top -= 1
+            node = stack[top]
+            dx = node_com[node, 0] - cx
+            dy = node_com[node, 1] - cy
+            dz = node_com[node, 2] - cz
+            d = np.sqrt(dx * dx + dy * dy + dz * dz) - radius
+            if d > 0.0 and 2.0 * node_half[node] < theta * d:
+                if num_cells == cells.size:
+                    cells = _grow(cells)
+                cells[num_cells] = node
+                num_cells += 1
+            elif child_count[node] == 0:
+                if num_leaves == leaves.size:
+                    leaves = _grow(leaves)
+                leaves[num_leaves] = node
+                num_leaves += 1
+            else:
+                first = child_first[node]
+                for c in range(first, first + child_count[node]):
+                    stack[top] = c
+                    top += 1
+
+        for i in range(start, end):
+            if not active[i]:
+                continue
+            xi = pos[i, 0]
+            yi = pos[i, 1]
+            zi = pos[i, 2]
+            fx = 0.0
+            fy = 0.0
+            fz = 0.0
+            for c in range(num_cells):
+                node = cells[c]
+                dx = node_com[node, 0] - xi
+                dy = node_com[node, 1] - yi
+                dz = node_com[node, 2] - zi
+                dist = np.sqrt(dx * dx + dy * dy + dz * dz) + eps
+                s = node_mass[node] / (dist * dist * dist)
+                fx += s * dx
+                fy += s * dy
+                fz += s * dz
+            for l in range(num_leaves):
+                leaf = leaves[l]
+                for j in range(node_start[leaf], node_start[leaf] + node_count[leaf]):
+                    if j != i:
+                        dx = pos[j, 0] - xi
+                        dy = pos[j, 1] - yi
+                        dz = pos[j, 2] - zi
+                        dist = np.sqrt(dx * dx + dy * dy + dz * dz) + eps
+                        s = mass[j] / (dist * dist * dist)
+                        fx += s * dx
+                        fy += s * dy
+                        fz += s * dz
+            scale = G * mass[i]
+            forces[i, 0] = scale * fx
+            forces[i, 1] = scale * fy
+            forces[i, 2] = scale * fz
     return forces
+
+
+def compute_barnes_hut_group_forces(particles, theta=0.5, G=6.67430e-11, leaf_size=8, group_size=32, eps=1e-5,
+                                    targets=None):
+    """
+    Barnes-Hut gravity with one tree walk per group of nearby targets.
+    Groups are the largest octree nodes holding at most group_size particles.
+    Each group builds a cell and a leaf interaction list against its bounding
+    sphere, which every target in the group then evaluates; groups run in
+    parallel with Numba. With targets, only groups holding a target are
+    walked and only the targets' forces are evaluated and returned.
+    """
+    pos = particles["pos"]
+    n = pos.shape[0]
+    if n == 0:
+        return torch.zeros_like(pos)
+    with timed("tree_build"):
+        tree = build_octree(pos.detach().cpu().numpy(), particles["mass"].detach().cpu().numpy().reshape(-1), leaf_size)
+    group_size = max(group_size, leaf_size)
+    count = tree["node_count"]
+    parent = tree["node_parent"]
+    parent_count = np.where(parent >= 0, count[np.maximum(parent, 0)], group_size + 1)
+    # Leaves that could not be split further form a group whatever their size.
+    is_group = ((count <= group_size) | (tree["child_count"] == 0)) & (parent_count > group_size)
+    groups = np.nonzero(is_group)[0]
+    active = np.ones(n, dtype=np.bool_)
+    if targets is not None:
+        active[:] = False
+        active[_sorted_targets(tree, targets)[0]] = True
+        # Skip the groups without a single target.
+        seen = np.concatenate(([0], np.cumsum(active)))
+        start = tree["node_start"][groups]
+        groups = groups[seen[start + count[groups]] > seen[start]]
+    with timed("tree_walk"):
+        sorted_forces = _barnes_hut_group_walk(
+            tree["pos"], tree["mass"], tree["node_start"], count, tree["node_half"],
+            tree["node_mass"], tree["node_com"], tree["child_first"], tree["child_count"], groups, active,
+            theta, G, eps,
+        )
+    forces = np.empty_like(sorted_forces)
+    forces[tree["order"]] = sorted_forces
+    if targets is not None:
+        forces = forces[targets.detach().cpu().numpy()]
+    return torch.from_numpy(forces).to(dtype=pos.dtype, device=pos.device)
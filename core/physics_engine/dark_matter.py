@@ -1,16 +1,18 @@
 import torch
 
-def compute_dark_matter_forces(particles, v0=200e3, G=6.67430e-11):
+def compute_dark_matter_forces(particles, v0=200e3, core_radius=1e9, G=6.67430e-11, targets=None):
     """
     Simple dark matter model: flat rotation curve (heuristic).
-    Applies a centripetal force to mimic dark matter halo.
+    Applies a centripetal force to mimic dark matter halo: the logarithmic
+    potential 0.5 v0^2 ln(r^2 + core_radius^2), i.e. F = -m v0^2 r / (r^2 + rc^2),
+    which is v0^2 / r far out and stays finite at the centre.
+    Returns the forces on all particles, or on the given target indices only.
     """
-    pos = particles["pos"]
-    n = pos.shape[0]
-    forces = torch.zeros_like(pos)
-    for i in range(n):
-        r = torch.norm(pos[i]) + 1e-5
-        # F = m v0^2 / r, direction is toward center
-        f = -particles["mass"][i] * v0**2 * pos[i] / (r**2)
-        forces[i] = f
-    return forces
\ No newline at end of file
+    # float64: r^2 and m v0^2 of stellar masses overflow float32.
+    pos = particles["pos"].double()
+    mass = particles["mass"].reshape(-1, 1).double()
+    if targets is not None:
+        pos, mass = pos[targets], mass[targets]
+    r2 = (pos * pos).sum(dim=1, keepdim=True) + core_radius ** 2
+    forces = -(pos / r2) * v0**2 * mass
+    return forces.to(particles["pos"].dtype)
@@ -1,20 +1,16 @@
 import torch
+from core.physics_engine.pairwise import inverse_square_sum
 
-def compute_electromagnetic_forces(particles, k=8.9875517923e9):
+def compute_electromagnetic_forces(particles, k=8.9875517923e9, targets=None):
     """
     Compute electromagnetic (Coulomb) forces between charged particles.
-    Assumes 'charge' field in particles dict.
+    Assumes 'charge' field in particles dict; like charges repel.
     """
     pos = particles["pos"]
     charge = particles.get("charge", None)
     if charge is None:
-        return torch.zeros_like(pos)
-    n = pos.shape[0]
-    forces = torch.zeros_like(pos)
-    for i in range(n):
-        diff = pos - pos[i]
-        dist = torch.norm(diff, dim=1).unsqueeze(1) + 1e-5
-        f = k * charge[i] * charge * diff / (dist ** 3)
-        f[i] = 0  # No self-force
-        forces[i] = torch.sum(f, dim=0)
-    return forces
+        return torch.zeros_like(pos) if targets is None else torch.zeros_like(pos[targets])
+    charge = charge.reshape(-1)
+    field = inverse_square_sum(pos, charge, targets=targets)
+    target_charge = charge if targets is None else charge[targets]
+    return -k * target_charge.unsqueeze(1).to(pos.dtype) * field
@@ -1,30 +1,193 @@
 import torch
+import numpy as np
+from numba import njit, prange
 
-def compute_fluid_dynamics(particles, h=1.0, rho0=1.0, k=1.0, mu=0.1):
+
+@njit(inline="always")
+def _cell_hash(cx, cy, cz, mask):
+    # Spatial hash (Teschner et al.); collisions only cost extra distance checks.
+    return ((cx * 73856093) ^ (cy * 19349663) ^ (cz * 83492791)) & mask
+
+
+@njit(inline="always")
+def _kernel(r, h):
+    """Cubic spline kernel W(r, h) with compact support 2h (3D normalisation)."""
+    q = r / h
+    sigma = 1.0 / (np.pi * h * h * h)
+    if q < 1.0:
+        return sigma * (1.0 - 1.5 * q * q + 0.75 * q * q * q)
+    if q < 2.0:
+        return sigma * 0.25 * (2.0 - q) ** 3
+    return 0.0
+
+
+@njit(inline="always")
+def _kernel_derivative(r, h):
+    """dW/dr of the cubic spline kernel."""
+    q = r / h
+    sigma = 1.0 / (np.pi * h * h * h * h)
+    if q < 1.0:
+        return sigma * (-3.0 * q + 2.25 * q * q)
+    if q < 2.0:
+        return -sigma * 0.75 * (2.0 - q) ** 2
+    return 0.0
+
+
+@njit(parallel=True, nogil=True, cache=True)
+def _bin_particles(pos, cell_size, mask):
+    n = pos.shape[0]
+    cells = np.empty((n, 3), dtype=np.int64)
+    buckets = np.empty(n, dtype=np.int64)
+    for i in prange(n):
+        cx = np.int64(np.floor(pos[i, 0] / cell_size))
+        cy = np.int64(np.floor(pos[i, 1] / cell_size))
+        cz = np.int64(np.floor(pos[i, 2] / cell_size))
+        cells[i, 0] = cx
+        cells[i, 1] = cy
+        cells[i, 2] = cz
+        buckets[i] = _cell_hash(cx, cy, cz, mask)
+    return cells, buckets
+
+
+@njit(inline="always")
+def _neighbour_buckets(cells, i, mask, out):
+    """Collect the distinct hash buckets of the 27 cells around particle i."""
+    count = 0
+    for ox in range(-1, 2):
+        for oy in range(-1, 2):
+            for oz in range(-1, 2):
+                b = _cell_hash(cells[i, 0] + ox, cells[i, 1] + oy, cells[i, 2] + oz, mask)
+                seen = False
+                for k in range(count):
+                    if out[k] == b:
+                        seen = True
+                        break
+                if not seen:
+                    out[count] = b
+                    count += 1
+    return count
+
+
+@njit(parallel=True, nogil=True, cache=True)
+def _sph_density(pos, mass, cells, order, bucket_start, mask, h):
+    n = pos.shape[0]
+    support2 = 4.0 * h * h
+    rho = np.zeros(n)
+    for s in prange(n):
+        i = order[s]
+        buckets = np.empty(27, dtype=np.int64)
+        num_buckets = _neighbour_buckets(cells, i, mask, buckets)
+        acc = 0.0
+        for b in range(num_buckets):
+            for q in range(bucket_start[buckets[b]], bucket_start[buckets[b] + 1]):
+                j = order[q]
+                dx = pos[i, 0] - pos[j, 0]
+                dy = pos[i, 1] - pos[j, 1]
+                dz = pos[i, 2] - pos[j, 2]
+                r2 = dx * dx + dy * dy + dz * dz
+                if r2 < support2:
+                    acc += mass[j] * _kernel(np.sqrt(r2), h)
+        rho[i] = acc
+    return rho
+
+
+@njit(parallel=True, nogil=True, cache=True)
+def _sph_forces(pos, vel, mass, rho, cells, order, bucket_start, sinks, mask, h, rho0, k, mu):
+    support2 = 4.0 * h * h
+    forces = np.zeros((sinks.size, 3))
+    for s in prange(sinks.size):
+        i = sinks[s]
+        buckets = np.empty(27, dtype=np.int64)
+        num_buckets = _neighbour_buckets(cells, i, mask, buckets)
+        pi = k * (rho[i] - rho0) / (rho[i] * rho[i])
+        fx = 0.0
+        fy = 0.0
+        fz = 0.0
+        for b in range(num_buckets):
+            for q in range(bucket_start[buckets[b]], bucket_start[buckets[b] + 1]):
+                j = order[q]
+                if j == i:
+                    continue
+                dx = pos[i, 0] - pos[j, 0]
+                dy = pos[i, 1] - pos[j, 1]
+                dz = pos[i, 2] - pos[j, 2]
+                r2 = dx * dx + dy * dy + dz * dz
+                if r2 >= support2:
+                    continue
+                r = np.sqrt(r2)
+                # Pressure: -m_j (P_i / rho_i^2 + P_j / rho_j^2) grad_i W
+                pressure = -mass[j] * (pi + k * (rho[j] - rho0) / (rho[j] * rho[j])) * _kernel_derivative(r, h) / (r + 1e-5)
+                fx += pressure * dx
+                fy += pressure * dy
+                fz += pressure * dz
+                # Viscosity: mu m_j (v_j - v_i) / rho_j W
+                visc = mu * mass[j] / rho[j] * _kernel(r, h)
+                fx += visc * (vel[j, 0] - vel[i, 0])
+                fy += visc * (vel[j, 1] - vel[i, 1])
+                fz += visc * (vel[j, 2] - vel[i, 2])
+        # The sums above are accelerations; the integrators divide forces by mass.
+        forces[s, 0] = mass[i] * fx
+        forces[s, 1] = mass[i] * fy
+        forces[s, 2] = mass[i] * fz
+    return forces
+
+
+def smoothing_length(pos, eta=1.3):
     """
-    Minimal SPH (Smoothed Particle Hydrodynamics) force implementation.
-    Assumes 'pos', 'vel', and 'mass' in particles dict.
+    eta times the mean inter-particle spacing, from the volume (or area, or
+    length) the central 90% of the particles span on each axis; axes the
+    distribution is flat along are left out. eta = 1.3 gives some 70
+    neighbours within the kernel support in 3D.
     """
-    pos = particles["pos"]
-    vel = particles["vel"]
-    mass = particles["mass"].flatten()
     n = pos.shape[0]
-    forces = torch.zeros_like(pos)
-    rho = torch.zeros(n, device=pos.device)
-    for i in range(n):
-        r_ij = pos - pos[i]
-        dist = torch.norm(r_ij, dim=1)
-        W = torch.exp(-dist**2 / (h**2))
-        rho[i] = torch.sum(mass * W)
-    for i in range(n):
-        f_pressure = torch.zeros(3, device=pos.device)
-        f_visc = torch.zeros(3, device=pos.device)
-        for j in range(n):
-            if i != j:
-                r = pos[i] - pos[j]
-                dist = torch.norm(r) + 1e-5
-                W_grad = -2 * r * torch.exp(-dist**2 / (h**2)) / (h**2)
-                f_pressure += -mass[j] * (k * (rho[i] - rho0) / rho[i]**2 + k * (rho[j] - rho0) / rho[j]**2) * W_grad
-                f_visc += mu * mass[j] * (vel[j] - vel[i]) / rho[j] * torch.exp(-dist**2 / (h**2))
-        forces[i] = f_pressure + f_visc
-    return forces
+    extents = np.diff(np.percentile(pos, [5.0, 95.0], axis=0), axis=0)[0]
+    extents = extents[extents > 1e-3 * extents.max()]
+    if extents.size == 0:
+        return 1.0
+    return float(eta * (np.prod(extents) / n) ** (1.0 / extents.size))
+
+
+def compute_fluid_dynamics(particles, h=None, rho0=1.0, k=1.0, mu=0.1, eta=1.3, targets=None):
+    """
+    SPH (Smoothed Particle Hydrodynamics) force implementation on a hashed
+    uniform grid with cell size 2h, the support of the cubic spline kernel.
+    Only the 27 cells around each particle are visited, in parallel Numba loops.
+    Without h the smoothing length follows the particle spacing
+    (smoothing_length), so the neighbour count stays bounded at any scale.
+    Assumes 'pos', 'vel', and 'mass' in particles dict. With targets, the
+    densities are still computed for every particle (neighbours need them)
+    but forces only for the targets.
+    """
+    pos_t = particles["pos"]
+    n = pos_t.shape[0]
+    if n == 0:
+        return torch.zeros_like(pos_t)
+    pos = np.ascontiguousarray(pos_t.detach().cpu().numpy(), dtype=np.float64)
+    if h is None:
+        h = smoothing_length(pos, eta)
+    vel = np.ascontiguousarray(particles["vel"].detach().cpu().numpy(), dtype=np.float64)
+    mass = np.ascontiguousarray(particles["mass"].detach().cpu().numpy().reshape(-1), dtype=np.float64)
+
+    # Hash table with at least two buckets per particle, sorted by bucket.
+    table_size = 1 << max(int(2 * n - 1).bit_length(), 1)
+    mask = table_size - 1
+    cells, buckets = _bin_particles(pos, 2.0 * h, mask)
+    order = np.argsort(buckets, kind="stable")
+    bucket_start = np.zeros(table_size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(buckets, minlength=table_size), out=bucket_start[1:])
+
+    rho = _sph_density(pos, mass, cells, order, bucket_start, mask, h)
+    if targets is None:
+        sinks = order
+    else:
+        # Targets in bucket order, like the full pass, so neighbours stay in cache.
+        sinks = np.asarray(targets.detach().cpu().numpy(), dtype=np.int64)
+        perm = np.argsort(buckets[sinks], kind="stable")
+        sinks = sinks[perm]
+    sorted_forces = _sph_forces(pos, vel, mass, rho, cells, order, bucket_start, sinks, mask, h, rho0, k, mu)
+    forces = np.empty_like(sorted_forces)
+    if targets is None:
+        forces[order] = sorted_forces
+    else:
+        forces[perm] = sorted_forces
+    return torch.from_numpy(forces).to(dtype=pos_t.dtype, device=pos_t.device)
@@ -0,0 +1,349 @@
+import torch
+import numpy as np
+from numba import njit, prange
+from core.physics_engine.octree import build_octree
+from utils.profiler import timed
+
+# Expansions use the complex solid harmonics of Dehnen (2014):
+#   regular    Y_n^m(r) = (-1)^m r^n / (n+m)! P_n^m(cos t) e^{i m p}
+#   irregular  T_n^m(r) = (-1)^m (n-m)! / r^(n+1) P_n^m(cos t) e^{i m p}
+# so that 1/|x - y| = sum_nm conj(Y_n^m(y)) T_n^m(x) for |y| < |x|. Multipoles
+# are M_n^m = sum_j m_j conj(Y_n^m(x_j - z)) and locals are stored such that
+# phi(x) = sum_nm conj(Y_n^m(x - s)) L_n^m.
+# Coefficient (n, m) lives at index n*n + n + m, with -n <= m <= n.
+
+
+@njit(inline="always")
+def _idx(n, m):
+    return n * n + n + m
+
+
+@njit(cache=True)
+def _regular(x, y, z, p, out):
+    """Fill out with Y_n^m(x, y, z) for n <= p."""
+    r2 = x * x + y * y + z * z
+    w = complex(x, y)
+    diag = 1.0 + 0.0j
+    for m in range(p + 1):
+        if m > 0:
+            diag = diag * w / (2 * m)
+        out[_idx(m, m)] = diag
+        prev2 = 0.0j
+        prev1 = diag
+        for n in range(m + 1, p + 1):
+            cur = ((2 * n - 1) * z * prev1 - r2 * prev2) / ((n + m) * (n - m))
+            out[_idx(n, m)] = cur
+            prev2 = prev1
+            prev1 = cur
+    for n in range(1, p + 1):
+        for m in range(1, n + 1):
+            v = out[_idx(n, m)].conjugate()
+            out[_idx(n, -m)] = -v if m % 2 else v
+
+
+@njit(cache=True)
+def _irregular(x, y, z, p, out):
+    """Fill out with T_n^m(x, y, z) for n <= p."""
+    r2 = x * x + y * y + z * z
+    inv_r2 = 1.0 / r2
+    w = complex(x, y)
+    diag = (1.0 / np.sqrt(r2)) + 0.0j
+    for m in range(p + 1):
+        if m > 0:
+            diag = diag * w * (2 * m - 1) * inv_r2
+        out[_idx(m, m)] = diag
+        prev2 = 0.0j
+        prev1 = diag
+        for n in range(m + 1, p + 1):
+            cur = ((2 * n - 1) * z * prev1 - (n + m - 1) * (n - m - 1) * prev2) * inv_r2
+            out[_idx(n, m)] = cur
+            prev2 = prev1
+            prev1 = cur
+    for n in range(1, p + 1):
+        for m in range(1, n + 1):
+            v = out[_idx(n, m)].conjugate()
+            out[_idx(n, -m)] = -v if m % 2 else v
+
+
+@njit(nogil=True, cache=True)
+def _node_radii(pos, node_start, node_count, node_center, node_half, node_com, child_first, child_count):
+    """Radius of the sphere around each node's centre of mass that holds all its particles."""
+    num_nodes = node_start.size
+    radius = np.zeros(num_nodes)
+    # Breadth-first order puts children after their parent.
+    for node in range(num_nodes - 1, -1, -1):
+        cx = node_com[node, 0]
+        cy = node_com[node, 1]
+        cz = node_com[node, 2]
+        if child_count[node] == 0:
+            r2 = 0.0
+            for j in range(node_start[node], node_start[node] + node_count[node]):
+                d2 = (pos[j, 0] - cx) ** 2 + (pos[j, 1] - cy) ** 2 + (pos[j, 2] - cz) ** 2
+                r2 = max(r2, d2)
+            radius[node] = np.sqrt(r2)
+        else:
+            r = 0.0
+            for c in range(child_first[node], child_first[node] + child_count[node]):
+                d = np.sqrt((node_com[c, 0] - cx) ** 2 + (node_com[c, 1] - cy) ** 2 + (node_com[c, 2] - cz) ** 2)
+                r = max(r, d + radius[c])
+            box = np.sqrt(3.0) * node_half[node] + np.sqrt(
+                (node_center[node, 0] - cx) ** 2 + (node_center[node, 1] - cy) ** 2 + (node_center[node, 2] - cz) ** 2
+            )
+            radius[node] = min(r, box)
+    return radius
+
+
+@njit(parallel=True, nogil=True, cache=True)
+def _p2m(pos, mass, node_start, node_count, node_com, leaves, p, multipoles):
+    size = (p + 1) * (p + 1)
+    for k in prange(leaves.size):
+        node = leaves[k]
+        harm = np.empty(size, dtype=np.complex128)
+        for j in range(node_start[node], node_start[node] + node_count[node]):
+            _regular(pos[j, 0] - node_com[node, 0], pos[j, 1] - node_com[node, 1], pos[j, 2] - node_com[node, 2], p, harm)
+            for i in range(size):
+                multipoles[node, i] += mass[j] * harm[i].conjugate()
+
+
+@njit(parallel=True, nogil=True, cache=True)
+def _m2m(nodes, node_com, child_first, child_count, p, multipoles):
+    size = (p + 1) * (p + 1)
+    for k in prange(nodes.size):
+        node = nodes[k]
+        harm = np.empty(size, dtype=np.complex128)
+        for c in range(child_first[node], child_first[node] + child_count[node]):
+            _regular(node_com[c, 0] - node_com[node, 0], node_com[c, 1] - node_com[node, 1],
+                     node_com[c, 2] - node_com[node, 2], p, harm)
+            for n in range(p + 1):
+                for m in range(-n, n + 1):
+                    acc = 0.0j
+                    for kk in range(n + 1):
+                        for l in range(-kk, kk + 1):
+                            if abs(m - l) <= n - kk:
+                                acc += harm[_idx(kk, l)].conjugate() * multipoles[c, _idx(n - kk, m - l)]
+                    multipoles[node, _idx(n, m)] += acc
+
+
+@njit(cache=True)
+def _push_pair(buf, count, a, b):
+    if count == buf.shape[0]:
+        grown = np.empty((buf.shape[0] * 2, 2), dtype=buf.dtype)
+        grown[:count] = buf[:count]
+        buf = grown
+    buf[count, 0] = a
+    buf[count, 1] = b
+    return buf
+
+
+@njit(nogil=True, cache=True)
+def _dual_walk(node_com, radius, child_first, child_count, theta):
+    """Dual tree traversal returning (target, source) pairs for M2L and P2P."""
+    stack = np.empty((1024, 2), dtype=np.int64)
+    m2l = np.empty((1024, 2), dtype=np.int64)
+    p2p = np.empty((1024, 2), dtype=np.int64)
+    top = 0
+    num_m2l = 0
+    num_p2p = 0
+    stack = _push_pair(stack, top, 0, 0)
+    top = 1
+    while top > 0:
+        top -= 1
+        a = stack[top, 0]
+        b = stack[top, 1]
+        a_leaf = child_count[a] == 0
+        b_leaf = child_count[b] == 0
+        if a == b:
+            if a_leaf:
+                p2p = _push_pair(p2p, num_p2p, a, a)
+                num_p2p += 1
+            else:
+                for ca in range(child_first[a], child_first[a] + child_count[a]):
+                    for cb in range(child_first[a], child_first[a] + child_count[a]):
+                        stack = _push_pair(stack, top, ca, cb)
+                        top += 1
+            continue
+        d = np.sqrt((node_com[a, 0] - node_com[b, 0]) ** 2 + (node_com[a, 1] - node_com[b, 1]) ** 2
+                    + (node_com[a, 2] - node_com[b, 2]) ** 2)
+        if radius[a] + radius[b] < theta * d:
+            m2l = _push_pair(m2l, num_m2l, a, b)
+            num_m2l += 1
+        elif a_leaf and b_leaf:
+            p2p = _push_pair(p2p, num_p2p, a, b)
+            num_p2p += 1
+        elif b_leaf or (not a_leaf and radius[a] >= radius[b]):
+            for ca in range(child_first[a], child_first[a] + child_count[a]):
+                stack = _push_pair(stack, top, ca, b)
+                top += 1
+        else:
+            for cb in range(child_first[b], child_first[b] + child_count[b]):
+                stack = _push_pair(stack, top, a, cb)
+                top += 1
+    return m2l[:num_m2l], p2p[:num_p2p]
+
+
+@njit(parallel=True, nogil=True, cache=True)
+def _m2l(targets, offsets, sources, node_com, p, multipoles, locals_):
+    for k in prange(targets.size):
+        t = targets[k]
+        harm = np.empty((2 * p + 1) * (2 * p + 1), dtype=np.complex128)
+        for q in range(offsets[k], offsets[k + 1]):
+            s = sources[q]
+            _irregular(node_com[t, 0] - node_com[s, 0], node_com[t, 1] - node_com[s, 1],
+                       node_com[t, 2] - node_com[s, 2], 2 * p, harm)
+            # Only m >= 0 is accumulated; the rest follows from symmetry below.
+            for n in range(p + 1):
+                for m in range(n + 1):
+                    acc = 0.0j
+                    for kk in range(p + 1):
+                        for l in range(-kk, kk + 1):
+                            acc += multipoles[s, _idx(kk, l)] * harm[_idx(n + kk, m + l)]
+                    locals_[t, _idx(n, m)] += -acc if n % 2 else acc
+        for n in range(1, p + 1):
+            for m in range(1, n + 1):
+                v = locals_[t, _idx(n, m)].conjugate()
+                locals_[t, _idx(n, -m)] = -v if m % 2 else v
+
+
+@njit(parallel=True, nogil=True, cache=True)
+def _l2l(nodes, node_parent, node_com, p, locals_):
+    size = (p + 1) * (p + 1)
+    for k in prange(nodes.size):
+        node = nodes[k]
+        parent = node_parent[node]
+        harm = np.empty(size, dtype=np.complex128)
+        _regular(node_com[node, 0] - node_com[parent, 0], node_com[node, 1] - node_com[parent, 1],
+                 node_com[node, 2] - node_com[parent, 2], p, harm)
+        for kk in range(p + 1):
+            for l in range(-kk, kk + 1):
+                acc = 0.0j
+                for n in range(kk, p + 1):
+                    for m in range(-n, n + 1):
+                        if abs(m - l) <= n - kk:
+                            acc += harm[_idx(n - kk, m - l)].conjugate() * locals_[parent, _idx(n, m)]
+                locals_[node, _idx(kk, l)] += acc
+
+
+@njit(parallel=True, nogil=True, cache=True)
+def _l2p_p2p(pos, mass, node_start, node_count, node_com, leaves, offsets, sources, active, p, locals_, eps):
+    n_particles = pos.shape[0]
+    field = np.zeros((n_particles, 3))
+    size = (p + 1) * (p + 1)
+    for k in prange(leaves.size):
+        leaf = leaves[k]
+        harm = np.empty(size, dtype=np.complex128)
+        for i in range(node_start[leaf], node_start[leaf] + node_count[leaf]):
+            if not active[i]:
+                continue
+            xi = pos[i, 0]
+            yi = pos[i, 1]
+            zi = pos[i, 2]
+            # Far field: translate the local expansion to the particle and keep
+            # the dipole terms, whose coefficients are the potential gradient.
+            _regular(xi - node_com[leaf, 0], yi - node_com[leaf, 1], zi - node_com[leaf, 2], p, harm)
+            l10 = 0.0j
+            l11 = 0.0j
+            for n in range(1, p + 1):
+                for m in range(-n, n + 1):
+                    if abs(m) <= n - 1:
+                        l10 += harm[_idx(n - 1, m)].conjugate() * locals_[leaf, _idx(n, m)]
+                    if abs(m - 1) <= n - 1:
+                        l11 += harm[_idx(n - 1, m - 1)].conjugate() * locals_[leaf, _idx(n, m)]
+            fx = l11.real
+            fy = l11.imag
+            fz = l10.real
+            # Near field: direct sums against the leaf's P2P list.
+            for q in range(offsets[k], offsets[k + 1]):
+                src = sources[q]
+                for j in range(node_start[src], node_start[src] + node_count[src]):
+                    if j != i:
+                        dx = pos[j, 0] - xi
+                        dy = pos[j, 1] - yi
+                        dz = pos[j, 2] - zi
+                        dist = np.sqrt(dx * dx + dy * dy + dz * dz) + eps
+                        s = mass[j] / (dist * dist * dist)
+                        fx += s * dx
+                        fy += s * dy
+                        fz += s * dz
+            field[i, 0] = fx
+            field[i, 1] = fy
+            field[i, 2] = fz
+    return field
+
+
+def _group_pairs(pairs, targets):
+    """Sort (target, source) pairs by target and return CSR offsets over the sorted targets."""
+    pairs = pairs[np.argsort(pairs[:, 0], kind="stable")]
+    offsets = np.append(np.searchsorted(pairs[:, 0], targets), pairs.shape[0]).astype(np.int64)
+    return offsets, np.ascontiguousarray(pairs[:, 1])
+
+
+def compute_fmm_forces(particles, order=4, theta=0.7, G=6.67430e-11, leaf_size=64, eps=1e-5, targets=None):
+    """
+    Fast Multipole Method gravity on the linear octree.
+    Multipole expansions of the given order are built bottom-up, cells that
+    pass (r_a + r_b) < theta * d in a dual tree traversal interact through
+    M2L, locals are pushed down with L2L and evaluated at the particles;
+    everything else is summed directly leaf by leaf. With targets, the
+    expansions are still built for the whole tree but the L2P and direct
+    sums only run for the leaves and particles of the targets.
+    """
+    pos = particles["pos"]
+    n = pos.shape[0]
+    if n == 0:
+        return torch.zeros_like(pos)
+    # Forces come from the dipole terms of the local expansion.
+    p = max(int(order), 1)
+    with timed("tree_build"):
+        tree = build_octree(pos.detach().cpu().numpy(), particles["mass"].detach().cpu().numpy().reshape(-1), leaf_size)
+    spos = tree["pos"]
+    smass = tree["mass"]
+    node_com = tree["node_com"]
+    child_first = tree["child_first"]
+    child_count = tree["child_count"]
+    level_offset = tree["level_offset"]
+    num_nodes = tree["node_start"].size
+    leaves = np.nonzero(child_count == 0)[0]
+    active = np.ones(n, dtype=np.bool_)
+    if targets is not None:
+        rank = np.empty_like(tree["order"])
+        rank[tree["order"]] = np.arange(n)
+        active[:] = False
+        active[rank[targets.detach().cpu().numpy()]] = True
+
+    with timed("fmm_upward"):
+        radius = _node_radii(spos, tree["node_start"], tree["node_count"], tree["node_center"], tree["node_half"],
+                             node_com, child_first, child_count)
+        multipoles = np.zeros((num_nodes, (p + 1) * (p + 1)), dtype=np.complex128)
+        locals_ = np.zeros_like(multipoles)
+
+        _p2m(spos, smass, tree["node_start"], tree["node_count"], node_com, leaves, p, multipoles)
+        for level in range(level_offset.size - 3, -1, -1):
+            nodes = np.arange(level_offset[level], level_offset[level + 1])
+            nodes = nodes[child_count[nodes] > 0]
+            _m2m(nodes, node_com, child_first, child_count, p, multipoles)
+
+    with timed("tree_walk"):
+        m2l_pairs, p2p_pairs = _dual_walk(node_com, radius, child_first, child_count, theta)
+    with timed("fmm_m2l"):
+        if m2l_pairs.shape[0]:
+            m2l_targets = np.unique(m2l_pairs[:, 0])
+            m2l_offsets, m2l_sources = _group_pairs(m2l_pairs, m2l_targets)
+            _m2l(m2l_targets, m2l_offsets, m2l_sources, node_com, p, multipoles, locals_)
+    with timed("fmm_downward"):
+        for level in range(1, level_offset.size - 1):
+            _l2l(np.arange(level_offset[level], level_offset[level + 1]), tree["node_parent"], node_com, p, locals_)
+
+        if targets is not None:
+            seen = np.concatenate(([0], np.cumsum(active)))
+            start = tree["node_start"]
+            leaf_active = seen[start + tree["node_count"]] > seen[start]
+            leaves = leaves[leaf_active[leaves]]
+            p2p_pairs = p2p_pairs[leaf_active[p2p_pairs[:, 0]]]
+        p2p_offsets, p2p_sources = _group_pairs(p2p_pairs, leaves)
+        field = _l2p_p2p(spos, smass, tree["node_start"], tree["node_count"], node_com, leaves,
+                         p2p_offsets, p2p_sources, active, p, locals_, eps)
+    forces = np.empty_like(field)
+    forces[tree["order"]] = G * smass[:, None] * field
+    if targets is not None:
+        forces = forces[targets.detach().cpu().numpy()]
+    return torch.from_numpy(forces).to(dtype=pos.dtype, device=pos.device)
@@ -1,18 +1,29 @@
 import torch
 import numpy as np
-from numba import njit, prange
+from numba import njit, prange, get_num_threads
+from core.physics_engine.pairwise import inverse_square_sum, inverse_distance_sum
 
-def compute_gravity_forces(particles, G=6.67430e-11):
+def compute_gravity_forces(particles, G=6.67430e-11, targets=None):
+    """
+    Direct N^2 gravity as batched tensor blocks (CPU or CUDA).
+    Returns the forces on all particles, or on the given target indices only.
+    """
     pos = particles["pos"]
-    mass = particles["mass"]
-    n = pos.shape[0]
-    forces = torch.zeros_like(pos)
-    for i in range(n):
-        diff = pos - pos[i]
-        dist = torch.norm(diff, dim=1).unsqueeze(1) + 1e-5
-        f = G * mass[i] * mass * diff / (dist ** 3)
-        forces[i] = torch.sum(f, dim=0)
-    return forces
+    mass = particles["mass"].reshape(-1)
+    field = inverse_square_sum(pos, mass, targets=targets)
+    target_mass = mass if targets is None else mass[targets]
+    return G * target_mass.unsqueeze(1) * field
+
+def compute_total_energy(particles, G=6.67430e-11):
+    """
+    Kinetic plus gravitational potential energy of the system (float).
+    Used to measure the energy drift of an integrator.
+    """
+    # float64: m v^2 and G m^2 / r of SI masses overflow float32.
+    mass = particles["mass"].reshape(-1).double()
+    kinetic = 0.5 * (mass * (particles["vel"].double() ** 2).sum(dim=1)).sum()
+    potential = -0.5 * G * (mass * inverse_distance_sum(particles["pos"].double(), mass)).sum()
+    return (kinetic + potential).item()
 
 def compute_direct_gravity(particles, G=6.67430e-11):
     """
@@ -27,7 +38,7 @@ def compute_direct_gravity(particles, G=6.67430e-11):
     forces = _direct_gravity_numba(pos, mass, G)
     return torch.tensor(forces, dtype=particles["pos"].dtype, device=particles["pos"].device)
 
-@njit(parallel=True)
+@njit(parallel=True, nogil=True, cache=True)
 def _direct_gravity_numba(pos, mass, G):
     n = pos.shape[0]
     forces = np.zeros_like(pos)
@@ -40,3 +51,90 @@ def _direct_gravity_numba(pos, mass, G):
                 f += G * mass[i] * mass[j] * diff / (dist ** 3)
         forces[i] = f
     return forces
+
+# Tile width in particles: 256 targets x 3 coordinates stays well inside L1.
+_TILE = 256
+
+
+def compute_direct_gravity_tiled(particles, G=6.67430e-11, eps=1e-5, targets=None):
+    """
+    Direct N^2 gravity on structure-of-arrays buffers in the simulation dtype.
+    Each pair is visited once (Newton's third law) in cache-sized tiles; the
+    tile pairs are dealt round robin to one worker per thread, each with its
+    own reaction buffers, so the parallel loop stays race free.
+    The pair symmetry needs every target, so a subset of targets goes
+    through the batched tensor sum instead.
+    """
+    if targets is not None:
+        return compute_gravity_forces(particles, G, targets=targets)
+    pos = particles["pos"]
+    if pos.shape[0] == 0:
+        return torch.zeros_like(pos)
+    pos_np = pos.detach().cpu().numpy()
+    dtype = pos_np.dtype
+    x = np.ascontiguousarray(pos_np[:, 0])
+    y = np.ascontiguousarray(pos_np[:, 1])
+    z = np.ascontiguousarray(pos_np[:, 2])
+    mass = np.ascontiguousarray(particles["mass"].detach().cpu().numpy().reshape(-1), dtype=dtype)
+    num_tiles = (x.size + _TILE - 1) // _TILE
+    ti, tj = np.triu_indices(num_tiles)
+    workers = max(min(get_num_threads(), ti.size), 1)
+    forces = _direct_gravity_tiled(x, y, z, mass, ti.astype(np.int64), tj.astype(np.int64), workers, dtype.type(G), dtype.type(eps))
+    return torch.from_numpy(forces).to(device=pos.device)
+
+
+@njit(parallel=True, nogil=True, cache=True)
+def _direct_gravity_tiled(x, y, z, mass, tile_i, tile_j, workers, G, eps):
+    n = x.size
+    zero = x.dtype.type(0)
+    # Accelerations per unit G, accumulated per worker and reduced at the end.
+    # Indexing them by the prange variable (not the thread id) keeps the
+    # kernel free of dynamic globals, so it can be cached.
+    ax = np.zeros((workers, n), dtype=x.dtype)
+    ay = np.zeros((workers, n), dtype=x.dtype)
+    az = np.zeros((workers, n), dtype=x.dtype)
+    for t in prange(workers):
+        for k in range(t, tile_i.size, workers):
+            i_start = tile_i[k] * _TILE
+            i_end = min(i_start + _TILE, n)
+            j_start = tile_j[k] * _TILE
+            j_end = min(j_start + _TILE, n)
+            for i in range(i_start, i_end):
+                xi = x[i]
+                yi = y[i]
+                zi = z[i]
+                mi = mass[i]
+                fx = zero
+                fy = zero
+                fz = zero
+                for j in range(max(j_start, i + 1), j_end):
+                    dx = x[j] - xi
+                    dy = y[j] - yi
+                    dz = z[j] - zi
+                    dist = np.sqrt(dx * dx + dy * dy + dz * dz) + eps
+                    inv = dist * dist * dist
+                    sj = mass[j] / inv
+                    si = mi / inv
+                    fx += sj * dx
+                    fy += sj * dy
+                    fz += sj * dz
+                    ax[t, j] -= si * dx
+                    ay[t, j] -= si * dy
+                    az[t, j] -= si * dz
+                ax[t, i] += fx
+                ay[t, i] += fy
+                az[t, i] += fz
+    forces = np.empty((n, 3), dtype=x.dtype)
+    for i in prange(n):
+        sx = zero
+        sy = zero
+        sz = zero
+        for t in range(workers):
+            sx += ax[t, i]
+            sy += ay[t, i]
+            sz += az[t, i]
+        scale = G * mass[i]
+        forces[i, 0] = scale * sx
+        forces[i, 1] = scale * sy
+        forces[i, 2] = scale * sz
+    return forces
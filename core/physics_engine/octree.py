@@ -0,0 +1,152 @@
+import numpy as np
+
+# Morton keys interleave 21 bits per axis into a single 63-bit integer.
+MAX_LEVEL = 21
+
+
+def _spread_bits(v):
+    """Spread the low 21 bits of v so that they occupy every third bit."""
+    v = v.astype(np.uint64) & np.uint64(0x1FFFFF)
+    v = (v | (v << np.uint64(32))) & np.uint64(0x1F00000000FFFF)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x1F0000FF0000FF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x100F00F00F00F00F)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x10C30C30C30C30C3)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x1249249249249249)
+    return v
+
+
+def morton_keys(pos, center, half_size):
+    """
+    Compute 63-bit Morton keys of positions inside the cube (center, half_size).
+    Bit 0 of every 3-bit digit is x, bit 1 is y and bit 2 is z.
+    """
+    scale = (1 << MAX_LEVEL) / (2.0 * half_size)
+    q = np.floor((pos - (center - half_size)) * scale)
+    q = np.clip(q, 0, (1 << MAX_LEVEL) - 1).astype(np.uint64)
+    return _spread_bits(q[:, 0]) | (_spread_bits(q[:, 1]) << np.uint64(1)) | (_spread_bits(q[:, 2]) << np.uint64(2))
+
+
+def _ranges(starts, counts):
+    """Concatenate the index ranges [start, start + count) into one array."""
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+    return np.arange(total, dtype=np.int64) + offsets
+
+
+def build_octree(pos, mass, leaf_size=8):
+    """
+    Build a linear octree over particles sorted along a Morton curve.
+
+    The tree is stored as flat arrays in breadth-first order, so every level is
+    a contiguous block of nodes and the children of a node are contiguous too.
+    Each node owns the contiguous range [node_start, node_start + node_count)
+    of the Morton-ordered particles.
+
+    Args:
+        pos (np.ndarray): (N, 3) particle positions.
+        mass (np.ndarray): (N,) particle masses.
+        leaf_size (int): Maximum number of particles kept in a leaf.
+    Returns:
+        dict: Tree arrays (see keys below), all numpy.
+    """
+    pos = np.ascontiguousarray(pos, dtype=np.float64)
+    mass = np.ascontiguousarray(mass, dtype=np.float64).reshape(-1)
+    n = pos.shape[0]
+    min_pos = pos.min(axis=0)
+    max_pos = pos.max(axis=0)
+    center = (min_pos + max_pos) / 2
+    half_size = (max_pos - min_pos).max() / 2
+    half_size = half_size * (1 + 1e-6) + 1e-5
+
+    keys = morton_keys(pos, center, half_size)
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    spos = pos[order]
+    smass = mass[order]
+
+    # Level 0 is the root; every further level is split off the previous one.
+    level_start = [np.zeros(1, dtype=np.int64)]
+    level_count = [np.array([n], dtype=np.int64)]
+    level_center = [center.reshape(1, 3)]
+    level_half = [np.array([half_size])]
+    level_parent = [np.array([-1], dtype=np.int64)]
+    level_offset = [0, 1]
+    for level in range(1, MAX_LEVEL + 1):
+        counts = level_count[-1]
+        split = np.nonzero(counts > leaf_size)[0]
+        if split.size == 0:
+            break
+        idx = _ranges(level_start[-1][split], counts[split])
+        parent = np.repeat(split + level_offset[-2], counts[split])
+        prefix = keys[idx] >> np.uint64(3 * (MAX_LEVEL - level))
+        first = np.empty(idx.size, dtype=bool)
+        first[0] = True
+        first[1:] = prefix[1:] != prefix[:-1]
+        child_pos = np.nonzero(first)[0]
+        child_parent = parent[child_pos]
+        digit = (prefix[child_pos] & np.uint64(7)).astype(np.int64)
+        parent_local = child_parent - level_offset[-2]
+        half = level_half[-1][parent_local] / 2
+        offset = np.stack([(digit >> axis) & 1 for axis in range(3)], axis=1) * 2 - 1
+        level_start.append(idx[child_pos])
+        level_count.append(np.diff(np.append(child_pos, idx.size)).astype(np.int64))
+        level_center.append(level_center[-1][parent_local] + offset * half[:, None])
+        level_half.append(half)
+        level_parent.append(child_parent)
+        level_offset.append(level_offset[-1] + child_pos.size)
+
+    node_start = np.concatenate(level_start)
+    node_count = np.concatenate(level_count)
+    node_parent = np.concatenate(level_parent)
+    num_nodes = node_start.size
+    node_level = np.repeat(np.arange(len(level_start)), [s.size for s in level_start])
+
+    # Children of a parent are contiguous, so the first child and the count
+    # follow directly from the parent array.
+    child_first = np.full(num_nodes, -1, dtype=np.int64)
+    child_count = np.zeros(num_nodes, dtype=np.int64)
+    if num_nodes > 1:
+        parents = node_parent[1:]
+        boundary = np.ones(parents.size, dtype=bool)
+        boundary[1:] = parents[1:] != parents[:-1]
+        firsts = np.nonzero(boundary)[0]
+        child_first[parents[firsts]] = firsts + 1
+        child_count[parents[firsts]] = np.diff(np.append(firsts, parents.size))
+
+    # Leaves partition the Morton-ordered particles; sum them with reduceat and
+    # accumulate level by level towards the root. Avoiding prefix sums keeps
+    # light particles accurate next to very heavy ones.
+    node_mass = np.zeros(num_nodes)
+    node_moment = np.zeros((num_nodes, 3))
+    leaves = np.nonzero(child_count == 0)[0]
+    leaves = leaves[np.argsort(node_start[leaves], kind="stable")]
+    if n > 0:
+        node_mass[leaves] = np.add.reduceat(smass, node_start[leaves])
+        node_moment[leaves] = np.add.reduceat(spos * smass[:, None], node_start[leaves], axis=0)
+    for level in range(len(level_start) - 1, 0, -1):
+        nodes = np.arange(level_offset[level], level_offset[level + 1])
+        np.add.at(node_mass, node_parent[nodes], node_mass[nodes])
+        np.add.at(node_moment, node_parent[nodes], node_moment[nodes])
+    node_center = np.concatenate(level_center)
+    node_com = node_center.copy()
+    massive = node_mass > 0
+    node_com[massive] = node_moment[massive] / node_mass[massive][:, None]
+
+    return {
+        "order": order,
+        "pos": spos,
+        "mass": smass,
+        "node_start": node_start,
+        "node_count": node_count,
+        "node_parent": node_parent,
+        "node_level": node_level,
+        "level_offset": np.array(level_offset, dtype=np.int64),
+        "node_center": node_center,
+        "node_half": np.concatenate(level_half),
+        "node_mass": node_mass,
+        "node_com": node_com,
+        "child_first": child_first,
+        "child_count": child_count,
+    }
@@ -0,0 +1,99 @@
+import torch
+import psutil
+
+# Peak number of (rows x N) temporaries alive while one block is evaluated:
+# three displacement components, the distance, its cube and a weighted copy.
+_TEMPORARIES_PER_PAIR = 6
+# On the CPU, blocks larger than this fall out of cache and get slower.
+_CPU_BLOCK_BYTES = 64 * 1024 * 1024
+
+
+def available_memory(device):
+    """Bytes that can be allocated on the given device right now."""
+    if device.type == "cuda":
+        free, _ = torch.cuda.mem_get_info(device)
+        return free
+    return psutil.virtual_memory().available
+
+
+def pairwise_chunk_size(num_targets, num_sources, dtype, device, channels=1, memory_fraction=0.25):
+    """
+    Number of target rows evaluated per block so that the temporaries of one
+    block use at most memory_fraction of the currently available memory
+    (and stay cache sized on the CPU).
+    """
+    element_size = torch.empty((), dtype=dtype).element_size()
+    row_bytes = num_sources * element_size * (_TEMPORARIES_PER_PAIR + channels)
+    budget = available_memory(device) * memory_fraction
+    if device.type != "cuda":
+        budget = min(budget, _CPU_BLOCK_BYTES)
+    rows = int(budget // max(row_bytes, 1))
+    return max(1, min(num_targets, rows))
+
+
+def inverse_square_sum(pos, sources, targets=None, eps=1e-5, chunk_size=None):
+    """
+    Sum an inverse-square field over all sources with batched tensor blocks.
+    For each target i and source channel k this returns
+        sum_j sources[j, k] * (pos[j] - pos[i]) / (|pos[j] - pos[i]| + eps) ** 3
+    Rows are processed in blocks sized from the free memory of the device,
+    so N x N x 3 tensors are never allocated for large N.
+    Args:
+        pos (torch.Tensor): (N, 3) positions.
+        sources (torch.Tensor): (N,) or (N, K) source strengths (mass, charge, ...).
+        targets (torch.Tensor, optional): Indices of the target rows; all rows if None.
+        eps (float): Softening added to the distance.
+        chunk_size (int, optional): Rows per block; chosen automatically if None.
+    Returns:
+        torch.Tensor: (T, 3) field for 1-D sources, (T, K, 3) otherwise.
+    """
+    squeeze = sources.dim() == 1
+    sources = (sources.unsqueeze(1) if squeeze else sources).to(pos.dtype)
+    target_pos = pos if targets is None else pos[targets]
+    num_targets = target_pos.shape[0]
+    channels = sources.shape[1]
+    out = torch.zeros((num_targets, channels, 3), dtype=pos.dtype, device=pos.device)
+    if num_targets == 0 or pos.shape[0] == 0:
+        return out[:, 0] if squeeze else out
+    if chunk_size is None:
+        chunk_size = pairwise_chunk_size(num_targets, pos.shape[0], pos.dtype, pos.device, channels)
+    coords = pos.t().contiguous()
+    target_coords = target_pos.t()
+    for start in range(0, num_targets, chunk_size):
+        block = target_coords[:, start:start + chunk_size]
+        dx = coords[0].unsqueeze(0) - block[0].unsqueeze(1)
+        dy = coords[1].unsqueeze(0) - block[1].unsqueeze(1)
+        dz = coords[2].unsqueeze(0) - block[2].unsqueeze(1)
+        dist = (dx * dx).add_(dy * dy).add_(dz * dz).sqrt_().add_(eps)
+        # The self pair has zero displacement and contributes nothing.
+        inv_cube = dist.mul_(dist * dist).reciprocal_()
+        out[start:start + chunk_size, :, 0] = (inv_cube * dx) @ sources
+        out[start:start + chunk_size, :, 1] = (inv_cube * dy) @ sources
+        out[start:start + chunk_size, :, 2] = (inv_cube * dz) @ sources
+    return out[:, 0] if squeeze else out
+
+
+def inverse_distance_sum(pos, sources, eps=1e-5, chunk_size=None):
+    """
+    For every particle i return sum_{j != i} sources[j] / (|pos[j] - pos[i]| + eps),
+    evaluated over memory-bounded row blocks like inverse_square_sum.
+    """
+    sources = sources.reshape(-1).to(pos.dtype)
+    n = pos.shape[0]
+    out = torch.zeros(n, dtype=pos.dtype, device=pos.device)
+    if n == 0:
+        return out
+    if chunk_size is None:
+        chunk_size = pairwise_chunk_size(n, n, pos.dtype, pos.device)
+    coords = pos.t().contiguous()
+    for start in range(0, n, chunk_size):
+        block = coords[:, start:start + chunk_size]
+        rows = block.shape[1]
+        dx = coords[0].unsqueeze(0) - block[0].unsqueeze(1)
+        dy = coords[1].unsqueeze(0) - block[1].unsqueeze(1)
+        dz = coords[2].unsqueeze(0) - block[2].unsqueeze(1)
+        dist = (dx * dx).add_(dy * dy).add_(dz * dz).sqrt_().add_(eps)
+        diag = torch.arange(rows, device=pos.device)
+        dist[diag, diag + start] = float("inf")
+        out[start:start + rows] = dist.reciprocal_() @ sources
+    return out
@@ -0,0 +1,254 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from utils.trajectory import TrajectoryReader, TRAJECTORY_DIR
+
+INTERPOLATIONS = ("hermite", "linear", "none")
+
+class TrajectoryPlayer:
+    """
+    Plays a recorded trajectory without any physics. The play head is a
+    fractional frame position advanced by wall time (rate recorded frames
+    per second at speed 1, in either direction); frame() interpolates
+    between the two stored frames around it. A background thread keeps the
+    next prefetch frames in the play direction decoded in memory, so
+    rendering never waits on the disk unless the user seeks.
+    Interpolation: "hermite" (cubic, from the stored positions and
+    velocities; linear if vel was not recorded), "linear" or "none".
+    """
+
+    def __init__(self, reader, rate=30.0, prefetch=16, interpolation="hermite", loop=True):
+        self.reader = TrajectoryReader(reader) if isinstance(reader, str) else reader
+        if not len(self.reader):
+            raise ValueError(f"{self.reader.path} holds no frames")
+        self.rate = rate
+        self.prefetch = prefetch
+        self.interpolation = interpolation
+        self.loop = loop
+        self.position = 0.0
+        self.speed = 1.0
+        self.direction = 1
+        self.paused = False
+        self.hits = 0
+        self.misses = 0
+        self._fields = ("pos", "vel") if "vel" in self.reader.fields else ("pos",)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="trajectory-prefetch", daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        return len(self.reader)
+
+    def seek(self, frame):
+        self.position = float(min(max(frame, 0), len(self) - 1))
+        self._wake.set()
+
+    def seek_fraction(self, fraction):
+        self.seek(fraction * (len(self) - 1))
+
+    def seek_step(self, step):
+        """Jump to the stored frame nearest to simulation step."""
+        steps = self.reader.steps
+        i = int(np.clip(np.searchsorted(steps, step), 1, len(self) - 1)) if len(self) > 1 else 0
+        if i > 0 and step - steps[i - 1] <= steps[i] - step:
+            i -= 1
+        self.seek(i)
+
+    def set_speed(self, speed):
+        self.speed = max(float(speed), 1e-3)
+
+    def reverse(self):
+        self.direction = -self.direction
+        self._wake.set()
+
+    def advance(self, seconds):
+        """Move the play head by seconds of wall time."""
+        if self.paused or len(self) < 2:
+            return
+        position = self.position + self.direction * self.speed * self.rate * seconds
+        last = len(self) - 1
+        if self.loop:
+            position %= last
+        elif not 0 <= position <= last:
+            position = min(max(position, 0), last)
+            self.paused = True
+        self.position = position
+        self._wake.set()
+
+    def _load(self, frame):
+        return self.reader.read(frame, fields=self._fields)
+
+    def _get(self, frame):
+        with self._lock:
+            data = self._cache.get(frame)
+            if data is not None:
+                self._cache.move_to_end(frame)
+                self.hits += 1
+                return data
+            self.misses += 1
+        data = self._load(frame)
+        with self._lock:
+            self._cache[frame] = data
+            self._evict()
+        return data
+
+    def _evict(self):
+        while len(self._cache) > 2 * self.prefetch + 4:
+            self._cache.popitem(last=False)
+
+    def _wanted(self):
+        """Frames the play head will need next, nearest first."""
+        base = int(self.position)
+        frames = (base + self.direction * k for k in range(-1, self.prefetch + 1))
+        if self.loop:
+            return [f % len(self) for f in frames]
+        return [f for f in frames if 0 <= f < len(self)]
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(0.05)
+            self._wake.clear()
+            for frame in self._wanted():
+                if self._stop.is_set() or self._wake.is_set():
+                    break  # the play head moved; start over from its new position
+                with self._lock:
+                    if frame in self._cache:
+                        continue
+                data = self._load(frame)
+                with self._lock:
+                    # Insert as least recently used, so they do not push out frames being shown.
+                    self._cache[frame] = data
+                    self._cache.move_to_end(frame, last=False)
+                    self._evict()
+
+    def frame(self):
+        """Interpolated state at the play head, shaped like Simulation.frame()."""
+        i = int(self.position)
+        t = self.position - i
+        a = self._get(i)
+        pos = a["pos"]
+        step, sim_time = a["step"], a["time"]
+        if t > 0 and i + 1 < len(self) and self.interpolation != "none":
+            b = self._get(i + 1)
+            if b["pos"].shape == pos.shape:
+                h = b["time"] - a["time"]
+                if self.interpolation == "hermite" and "vel" in a and h > 0:
+                    t2, t3 = t * t, t * t * t
+                    pos = ((2 * t3 - 3 * t2 + 1) * pos + ((t3 - 2 * t2 + t) * h) * a["vel"]
+                           + (3 * t2 - 2 * t3) * b["pos"] + ((t3 - t2) * h) * b["vel"])
+                else:
+                    pos = pos + (b["pos"] - pos) * t
+                sim_time += (b["time"] - a["time"]) * t
+        return {
+            "pos": pos,
+            "color": None,
+            "count": pos.shape[0],
+            "step": step,
+            "time": sim_time,
+            "stats": {"frame": self.position, "frames": len(self), "speed": self.speed * self.direction,
+                      "prefetch_hits": self.hits, "prefetch_misses": self.misses},
+        }
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self.reader.close()
+
+def latest_trajectory(directory=TRAJECTORY_DIR):
+    """Most recently written trajectory directory, or None."""
+    if not os.path.isdir(directory):
+        return None
+    paths = [os.path.join(directory, name) for name in os.listdir(directory)]
+    paths = [p for p in paths if os.path.exists(os.path.join(p, "index.bin"))]
+    return max(paths, key=os.path.getmtime) if paths else None
+
+def run_playback(config, path=None):
+    """
+    Pygame playback of a recorded trajectory (the newest one by default),
+    drawn like a live run, through VisPy when config["renderer"] is "vispy".
+    Keys: SPACE pause, LEFT/RIGHT one frame (paused) or 5% seek,
+    UP/DOWN speed x2 / x0.5, R reverse, HOME/END, 0-9 seek to 0-90%,
+    I cycle interpolation, ESC quit. Yields the state after every frame.
+    """
+    import pygame
+    from graphics.pygame_renderer import ParticleRenderer
+
+    path = path or config.get("playback_path", None) or latest_trajectory()
+    if path is None:
+        print("No recorded trajectory to play.")
+        return
+    player = TrajectoryPlayer(path, rate=config.get("playback_rate", 30.0),
+                              interpolation=config.get("playback_interpolation", "hermite"))
+    pygame.init()
+    screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+    width, height = screen.get_size()
+    pygame.display.set_caption(f"PyVerse - Playback {os.path.basename(path)}")
+    font = pygame.font.SysFont("Consolas", 20)
+    clock = pygame.time.Clock()
+    renderer = ParticleRenderer()
+    running = True
+    last = time.perf_counter()
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    running = False
+                elif event.key == pygame.K_SPACE:
+                    player.paused = not player.paused
+                elif event.key in (pygame.K_LEFT, pygame.K_RIGHT):
+                    sign = 1 if event.key == pygame.K_RIGHT else -1
+                    jump = 1 if player.paused else max(len(player) // 20, 1)
+                    player.seek(round(player.position) + sign * jump)
+                elif event.key == pygame.K_UP:
+                    player.set_speed(player.speed * 2)
+                elif event.key == pygame.K_DOWN:
+                    player.set_speed(player.speed / 2)
+                elif event.key == pygame.K_r:
+                    player.reverse()
+                elif event.key == pygame.K_HOME:
+                    player.seek(0)
+                elif event.key == pygame.K_END:
+                    player.seek(len(player) - 1)
+                elif pygame.K_0 <= event.key <= pygame.K_9:
+                    player.seek_fraction((event.key - pygame.K_0) / 10)
+                elif event.key == pygame.K_i:
+                    player.interpolation = INTERPOLATIONS[(INTERPOLATIONS.index(player.interpolation) + 1) % len(INTERPOLATIONS)]
+        now = time.perf_counter()
+        player.advance(now - last)
+        last = now
+
+        screen.fill((0, 0, 0))
+        state = player.frame()
+        if config.get("renderer", "pygame") == "vispy":
+            from graphics.vispy_renderer import render_scene
+            render_scene(state, config)
+        else:
+            renderer.draw(screen, state["pos"], None, 6 if config.get("preset") == "solar_system" else 2)
+        stats = state["stats"]
+        hits, misses = stats["prefetch_hits"], stats["prefetch_misses"]
+        lines = [
+            f"Frame: {stats['frame']:.1f} / {stats['frames'] - 1}  Step: {state['step']}  Time: {state['time']:.4g}",
+            f"Particles: {state['count']}  FPS: {clock.get_fps():.2f}",
+            f"Speed: x{stats['speed']:g}  Interpolation: {player.interpolation}  Prefetch hits: {hits / max(hits + misses, 1):.0%}",
+            f"Status: {'PAUSED' if player.paused else 'PLAYING'}",
+            "SPACE: Pause | LEFT/RIGHT: Seek | UP/DOWN: Speed | R: Reverse | 0-9: Jump | I: Interpolation | ESC: Quit",
+        ]
+        for i, line in enumerate(lines):
+            screen.blit(font.render(line, True, (255, 255, 255)), (20, 20 + i * 28))
+        # Progress bar
+        progress = player.position / max(len(player) - 1, 1)
+        pygame.draw.rect(screen, (80, 80, 80), (20, height - 30, width - 40, 8))
+        pygame.draw.rect(screen, (180, 220, 255), (20, height - 30, int((width - 40) * progress), 8))
+        pygame.display.flip()
+        clock.tick(config.get("fps", 60))
+        yield state
+    player.close()
+    pygame.quit()
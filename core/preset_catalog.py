@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+# Presets live in subfolders of PRESET_ROOT (Default, user, ...); see
+# core.presets for the file formats. The BUILTIN_PRESETS names ("random"
+# among them) need no file and generate particle_count particles.
+PRESET_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets", "presets")
+BUILTIN_PRESETS = {
+    "random": {"type": "plummer"},
+    "plummer": {"type": "plummer"},
+    "disk_galaxy": {"type": "exponential_disk", "central_mass": 2e31},
+    "protoplanetary": {"type": "protoplanetary_disk"},
+}
+CATALOG_VERSION = 1
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pyverse")
+THUMBNAIL_SIZE = 16
+
+def _thumbnail(pos, size=THUMBNAIL_SIZE):
+    """size x size log-density image of the x/y positions as a hex string ("" if empty)."""
+    if pos.shape[0] == 0:
+        return ""
+    xy = pos[:, :2]
+    extent = np.abs(xy).max() or 1.0
+    idx = np.clip(np.rint((xy / extent + 1) * 0.5 * (size - 1)).astype(np.int64), 0, size - 1)
+    counts = np.bincount(idx[:, 1] * size + idx[:, 0], minlength=size * size)
+    image = np.log1p(counts)
+    return (255 * image / image.max()).astype(np.uint8).tobytes().hex()
+
+def thumbnail_pixels(entry):
+    """Thumbnail of a catalog entry as a (THUMBNAIL_SIZE, THUMBNAIL_SIZE) uint8 array (rows are y), or None."""
+    if not entry or not entry.get("thumbnail"):
+        return None
+    return np.frombuffer(bytes.fromhex(entry["thumbnail"]), dtype=np.uint8).reshape(THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+
+def _array_stats(path):
+    """Positions and total mass of an .npz file or .npy directory (positions memory-mapped)."""
+    if os.path.isdir(path):
+        pos = np.load(os.path.join(path, "pos.npy"), mmap_mode="r")
+        mass_path = os.path.join(path, "mass.npy")
+        mass = np.load(mass_path, mmap_mode="r") if os.path.exists(mass_path) else None
+    else:
+        with np.load(path) as data:
+            pos = data["pos"]
+            mass = data["mass"] if "mass" in data.files else None
+    pos = np.asarray(pos, dtype=np.float64).reshape(-1, 3)
+    return pos, float(np.sum(mass, dtype=np.float64)) if mass is not None else float(pos.shape[0])
+
+def index_preset(path):
+    """
+    Catalog entry of one preset (.json, .npz or .npy directory): kind,
+    number of bodies, total mass, generator type and thumbnail, plus the
+    mtime and size it was indexed at. Unreadable files get kind "invalid".
+    """
+    stat_path = os.path.join(path, "pos.npy") if os.path.isdir(path) else path
+    stat = os.stat(stat_path)
+    entry = {"path": path, "mtime": stat.st_mtime, "size": stat.st_size, "generator": None}
+    try:
+        if path.endswith(".json"):
+            with open(path) as f:
+                preset = json.load(f)
+            bodies = preset.get("bodies", [])
+            pos = np.array([b["position"] for b in bodies], dtype=np.float64).reshape(-1, 3)
+            mass = float(sum(b.get("mass", 1.0) for b in bodies))
+            if preset.get("arrays"):
+                extra_pos, extra_mass = _array_stats(os.path.join(os.path.dirname(path), preset["arrays"]))
+                pos, mass = np.concatenate((pos, extra_pos)), mass + extra_mass
+            entry.update(kind="json", generator=(preset.get("generator") or {}).get("type"))
+        else:
+            pos, mass = _array_stats(path)
+            entry.update(kind="arrays")
+        entry.update(bodies=pos.shape[0], total_mass=mass, thumbnail=_thumbnail(pos))
+    except (OSError, ValueError, KeyError, TypeError) as exc:
+        entry.update(kind="invalid", error=str(exc), bodies=0, total_mass=0.0, thumbnail="")
+    return entry
+
+def _priority(path):
+    """Rank of a preset path when one folder holds several presets of the same name: .json, then .npz, then a directory."""
+    return 0 if path.endswith(".json") else 1 if path.endswith(".npz") else 2
+
+def _preset_name(folder_path, item):
+    """Preset name of a directory item, or None if it is not a preset."""
+    if item.name.endswith((".json", ".npz")) and item.is_file():
+        return item.name.rsplit(".", 1)[0]
+    if item.is_dir() and os.path.exists(os.path.join(folder_path, item.name, "pos.npy")):
+        return item.name
+    return None
+
+class PresetCatalog:
+    """
+    Index of every preset under root, kept in a JSON cache file and keyed
+    on folder mtimes: refresh() stats the root and each preset folder, and
+    only folders whose mtime changed are listed again, where only files
+    with a new mtime or size are parsed. Saving over an existing file
+    keeps the folder mtime, so writers call update(path) (or refresh(full=True)
+    re-checks every file). Within a folder, a name held by several presets
+    resolves to the .json, else the .npz, else the .npy directory.
+    """
+
+    def __init__(self, root=PRESET_ROOT, cache_path=None):
+        self.root = os.path.abspath(root)
+        if cache_path is None:
+            key = hashlib.sha1(self.root.encode("utf-8")).hexdigest()[:12]
+            cache_path = os.path.join(CACHE_DIR, f"presets_{key}.json")
+        self.cache_path = cache_path
+        self.folders = {}
+        self._dirty = False
+        self._merged = None  # entries() result, rebuilt after self.folders changes
+        try:
+            with open(cache_path) as f:
+                cache = json.load(f)
+            if cache.get("version") == CATALOG_VERSION and cache.get("root") == self.root:
+                self.folders = cache["folders"]
+        except (OSError, ValueError):
+            pass
+
+    def _scan_folder(self, folder, mtime, full=False):
+        folder_path = os.path.join(self.root, folder)
+        old = self.folders.get(folder, {}).get("entries", {})
+        entries = {}
+        with os.scandir(folder_path) as items:
+            for item in items:
+                name = _preset_name(folder_path, item)
+                if name is None:
+                    continue
+                path = os.path.join(folder_path, item.name)
+                if name in entries and _priority(entries[name]["path"]) <= _priority(path):
+                    continue
+                cached = old.get(name)
+                if cached is not None and cached["path"] == path and not full:
+                    stat = os.stat(os.path.join(path, "pos.npy")) if item.is_dir() else item.stat()
+                    if (stat.st_mtime, stat.st_size) == (cached["mtime"], cached["size"]):
+                        entries[name] = cached
+                        continue
+                entries[name] = index_preset(path)
+        self.folders[folder] = {"mtime": mtime, "entries": entries}
+        self._dirty = True
+        self._merged = None
+
+    def refresh(self, full=False):
+        """Bring the index up to date; returns self."""
+        if not os.path.isdir(self.root):
+            return self
+        seen = set()
+        with os.scandir(self.root) as items:
+            for item in items:
+                if not item.is_dir():
+                    continue
+                seen.add(item.name)
+                mtime = item.stat().st_mtime
+                cached = self.folders.get(item.name)
+                if full or cached is None or cached["mtime"] != mtime:
+                    self._scan_folder(item.name, mtime, full)
+        for folder in set(self.folders) - seen:
+            del self.folders[folder]
+            self._dirty = True
+            self._merged = None
+        self.save()
+        return self
+
+    def update(self, path):
+        """Re-index one preset that was just written (or remove it if it is gone)."""
+        path = os.path.abspath(path)
+        folder = os.path.relpath(os.path.dirname(path), self.root)
+        name = os.path.basename(path).rsplit(".", 1)[0] if path.endswith((".json", ".npz")) else os.path.basename(path)
+        if folder not in self.folders:
+            self.refresh()
+            return
+        entries = self.folders[folder]["entries"]
+        mtime = os.stat(os.path.dirname(path)).st_mtime
+        current = entries.get(name)
+        if not os.path.exists(path):
+            if current is not None and current["path"] == path:
+                # A lower-priority preset of the same name may take its place.
+                self._scan_folder(folder, mtime)
+                self.save()
+            return
+        if current is None or _priority(path) <= _priority(current["path"]) or not os.path.exists(current["path"]):
+            entries[name] = index_preset(path)
+        self.folders[folder]["mtime"] = mtime
+        self._dirty = True
+        self._merged = None
+        self.save()
+
+    def save(self):
+        """Write the cache file (atomically) if anything changed; a read-only location is ignored."""
+        if not self._dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"version": CATALOG_VERSION, "root": self.root, "folders": self.folders}, f)
+            os.replace(tmp, self.cache_path)
+            self._dirty = False
+        except OSError:
+            pass
+
+    def _merged_entries(self):
+        if self._merged is None:
+            merged = {}
+            for folder in sorted(self.folders):
+                for name, entry in sorted(self.folders[folder]["entries"].items()):
+                    merged.setdefault(name, dict(entry, folder=folder))
+            self._merged = merged
+        return self._merged
+
+    def entries(self):
+        """name -> entry; on duplicate names the first folder in sorted order wins."""
+        return dict(self._merged_entries())
+
+    def names(self, builtin=True):
+        """Preset names, file presets first, then the built-in generators."""
+        names = list(self._merged_entries())
+        if builtin:
+            names += [name for name in BUILTIN_PRESETS if name not in names]
+        return names
+
+    def info(self, name):
+        entry = self._merged_entries().get(name)
+        if entry is None and name in BUILTIN_PRESETS:
+            return {"kind": "builtin", "generator": BUILTIN_PRESETS[name]["type"], "bodies": 0, "total_mass": 0.0, "thumbnail": ""}
+        return entry
+
+    def path(self, name):
+        entry = self._merged_entries().get(name)
+        return entry["path"] if entry else None
+
+_CATALOGS = {}
+
+def get_catalog(root=PRESET_ROOT, refresh=True):
+    """Shared catalog of root, brought up to date (cheaply) unless refresh is False."""
+    root = os.path.abspath(root)
+    catalog = _CATALOGS.get(root)
+    if catalog is None:
+        catalog = _CATALOGS[root] = PresetCatalog(root)
+    return catalog.refresh() if refresh else catalog
@@ -0,0 +1,138 @@
+import json
+import os
+import numpy as np
+import torch
+from core.generators import GENERATORS
+from core.preset_catalog import PRESET_ROOT, BUILTIN_PRESETS, get_catalog
+
+# Preset formats, in subfolders of PRESET_ROOT (Default, user, ...):
+#   name.json  bodies listed one dict each, optionally with
+#              "arrays": "file.npz" (or a .npy directory) and/or
+#              "generator": {"type": "plummer", "n": ..., <parameters>} and/or
+#              "physics": {"dark_matter": false, ...} (overrides CONFIG["physics"];
+#              "sph": {"h": ..., "rho0": ..., "k": ..., "mu": ...} sets the SPH parameters)
+#   name.npz   particle arrays (pos, vel, mass, optional color, charge)
+#   name/      one .npy file per field, memory-mapped on load
+PRESET_FIELDS = ("pos", "vel", "mass", "color", "charge")
+
+def empty_particles():
+    return {
+        "pos": torch.empty((0, 3), dtype=torch.float32),
+        "vel": torch.empty((0, 3), dtype=torch.float32),
+        "mass": torch.empty((0, 1), dtype=torch.float32),
+        "color": torch.empty((0, 3), dtype=torch.uint8),
+        "charge": torch.empty((0, 1), dtype=torch.float32),
+    }
+
+def find_preset(name, root=PRESET_ROOT):
+    """Path of the preset called name (.json, .npz or array directory), or None."""
+    return get_catalog(root).path(name)
+
+def preset_physics(name, root=PRESET_ROOT):
+    """physics switches a JSON preset sets for itself ({} for other presets)."""
+    path = name if name and os.path.exists(name) else find_preset(name, root) if name else None
+    if path is None or not path.endswith(".json"):
+        return {}
+    with open(path) as f:
+        return json.load(f).get("physics", {})
+
+def bodies_to_particles(bodies):
+    """Body dicts (position, velocity, mass, color, charge) to particle tensors, one conversion per field."""
+    n = len(bodies)
+    return {
+        "pos": torch.tensor([b["position"] for b in bodies], dtype=torch.float32).reshape(n, 3),
+        "vel": torch.tensor([b.get("velocity", (0, 0, 0)) for b in bodies], dtype=torch.float32).reshape(n, 3),
+        "mass": torch.tensor([b.get("mass", 1.0) for b in bodies], dtype=torch.float32).reshape(n, 1),
+        "color": torch.tensor([b.get("color", (255, 255, 255)) for b in bodies], dtype=torch.uint8).reshape(n, 3),
+        "charge": torch.tensor([b.get("charge", 0.0) for b in bodies], dtype=torch.float32).reshape(n, 1),
+    }
+
+def load_arrays(path):
+    """
+    Particle arrays from an .npz file or a directory of .npy files. The .npy
+    files are memory-mapped copy-on-write and wrapped without copying when
+    they already have the particle dtypes; an uncompressed .npz is read in
+    one pass per field.
+    """
+    if os.path.isdir(path):
+        arrays = {field: np.load(os.path.join(path, f"{field}.npy"), mmap_mode="c")
+                  for field in PRESET_FIELDS if os.path.exists(os.path.join(path, f"{field}.npy"))}
+    else:
+        with np.load(path) as data:
+            arrays = {field: data[field] for field in PRESET_FIELDS if field in data.files}
+    n = arrays["pos"].shape[0]
+    particles = empty_particles()
+    for field, template in particles.items():
+        if field in arrays:
+            array = np.asarray(arrays[field]).reshape((n,) + tuple(template.shape[1:]))
+            particles[field] = torch.from_numpy(array).to(template.dtype)
+        else:
+            default = 255 if field == "color" else 1.0 if field == "mass" else 0
+            particles[field] = torch.full((n,) + tuple(template.shape[1:]), default, dtype=template.dtype)
+    return particles
+
+def save_arrays(path, particles):
+    """
+    Write particles in the bulk preset format: an uncompressed .npz if path
+    ends in .npz, otherwise a directory of .npy files (memory-mappable).
+    """
+    count = particles.count if hasattr(particles, "count") else particles["pos"].shape[0]
+    arrays = {}
+    for field in PRESET_FIELDS:
+        value = particles.get(field, None)
+        if value is not None:
+            arrays[field] = value[:count].detach().cpu().numpy() if hasattr(value, "detach") else np.asarray(value)[:count]
+    if path.endswith(".npz"):
+        np.savez(path, **arrays)
+    else:
+        os.makedirs(path, exist_ok=True)
+        for field, array in arrays.items():
+            np.save(os.path.join(path, f"{field}.npy"), array)
+    return path
+
+def generate(spec, particle_count, seed=None):
+    """Run the generator described by spec ({"type": ..., "n": ..., parameters})."""
+    spec = dict(spec)
+    kind = spec.pop("type")
+    n = int(spec.pop("n", particle_count))
+    spec.setdefault("seed", seed)
+    return GENERATORS[kind](n, **spec)
+
+def concat_particles(parts):
+    parts = [p for p in parts if p["pos"].shape[0]]
+    if not parts:
+        return empty_particles()
+    if len(parts) == 1:
+        return parts[0]  # keeps memory-mapped arrays mapped
+    return {field: torch.cat([p[field] for p in parts]) for field in PRESET_FIELDS}
+
+def load_preset(name, particle_count=0, seed=None, root=PRESET_ROOT):
+    """
+    Particles of a preset: its JSON bodies, its companion arrays and
+    particle_count generated particles if it names a generator (a "n" in
+    the generator spec takes precedence).
+    Args:
+        name (str): Preset name or path of a .json/.npz file or array directory.
+        particle_count (int): Size of generated presets.
+        seed (int, optional): Seed of the generator.
+        root (str): Folder holding the preset subfolders.
+    Returns:
+        dict: pos, vel, mass, color and charge tensors (empty if the preset is unknown).
+    """
+    if name in BUILTIN_PRESETS and find_preset(name, root) is None:
+        return generate(BUILTIN_PRESETS[name], particle_count, seed)
+    path = name if name and os.path.exists(name) else find_preset(name, root) if name else None
+    if path is None:
+        if name:
+            print(f"Unknown preset {name!r}; starting empty.")
+        return empty_particles()
+    if not path.endswith(".json"):
+        return load_arrays(path)
+    with open(path) as f:
+        preset = json.load(f)
+    parts = [bodies_to_particles(preset.get("bodies", []))]
+    if preset.get("arrays"):
+        parts.append(load_arrays(os.path.join(os.path.dirname(path), preset["arrays"])))
+    if preset.get("generator"):
+        parts.append(generate(preset["generator"], particle_count, seed))
+    return concat_particles(parts)
@@ -0,0 +1,391 @@
+import os
+import time
+import queue
+import threading
+import numpy as np
+from contextlib import contextmanager
+from numba import get_num_threads
+from core.initializer import initialize_particles, simulation_device
+from core.particle_store import ParticleStore, INTEGRATOR_HISTORY
+from core.force_pipeline import build_force_pipeline, warm_up
+from core.physics_engine.gravity import compute_total_energy
+from core.time_stepper import get_integrator, integrate_step, ForceCounter
+from utils.logger import log_simulation_step, step_log_wants, start_step_log, stop_step_log
+from utils.trajectory import TrajectoryWriter, default_trajectory_path, unused_trajectory_path
+from utils.checkpoint import (save_checkpoint, load_checkpoint, checkpoint_path, latest_checkpoint,
+                              prune_checkpoints, CHECKPOINT_DIR)
+from utils.system_monitor import get_latest_stats, DEFAULT_INTERVAL
+from utils.profiler import timed, record_stage, set_timing, stage_summary
+
+# Config keys that steer this process's I/O; resume_from keeps the current values.
+RUN_CONTROL_KEYS = ("resume_from", "trajectory", "step_log", "checkpoint_every", "checkpoint_dir", "checkpoint_keep")
+
+def add_particle(particles, position, velocity, mass=1.0, color=(255, 255, 255)):
+    """Add a new particle to the simulation."""
+    if not isinstance(particles, ParticleStore):
+        particles = ParticleStore(particles)
+    particles.add_many([position], [velocity], [mass], color=[color])
+    return particles
+
+def remove_particle(particles, index):
+    """Remove a particle from the simulation by index (swap-remove)."""
+    if not isinstance(particles, ParticleStore):
+        particles = ParticleStore(particles)
+    particles.remove_many([index])
+    return particles
+
+def simulation_step(particles, model_fn, integrator, config, step):
+    """Perform a single simulation step."""
+    evaluations = getattr(model_fn, "particle_evaluations", 0)
+    force_seconds = getattr(model_fn, "seconds", 0.0)
+    start = time.perf_counter()
+    # Compute forces and integrate
+    particles = integrate_step(particles, model_fn, integrator, config)
+    step_time = time.perf_counter() - start
+    force_time = getattr(model_fn, "seconds", 0.0) - force_seconds
+    # Log and monitor
+    stats = get_latest_stats(config.get("monitor_interval", DEFAULT_INTERVAL))
+    # Full force evaluations equivalent (block timesteps evaluate subsets)
+    n = max(particles["pos"].shape[0], 1)
+    stats["force_evals"] = (getattr(model_fn, "particle_evaluations", 0) - evaluations) / n
+    stats["step_time"] = step_time
+    stats["force_time"] = force_time
+    stats["integrate_time"] = step_time - force_time
+    record_stage("step", step_time)
+    record_stage("force", force_time)
+    record_stage("integrate", step_time - force_time)
+    if config.get("log_energy", False) and step_log_wants(step):
+        # O(N^2), so only for the steps that are actually recorded; summed in float64.
+        stats["energy"] = compute_total_energy(particles)
+    with timed("logging"):
+        log_simulation_step(step, particles, stats)
+    return particles, stats
+
+class Simulation:
+    """
+    Headless simulation engine: owns the particle state, the force model and
+    the integrator, and steps without any display or frame-rate cap.
+    Front ends (pygame, VisPy, benchmarks) read self.particles between steps.
+    """
+
+    def __init__(self, config, particles=None):
+        self.config = config
+        self.step_count = 0
+        self.time = 0.0
+        self.stats = {}
+        self.recorder = None
+        if config.get("step_log", None):
+            start_step_log(config["step_log"], config.get("step_log_every", 1))
+        if config.get("resume_from", None):
+            # The checkpoint replaces the initial state, so the preset is not built.
+            self.particles = ParticleStore(particles)
+            self.resume_from(config["resume_from"])
+        else:
+            self.particles = ParticleStore(particles if particles is not None else initialize_particles(config))
+            self.rebuild()
+        if config.get("trajectory", None):
+            self.start_recording(config["trajectory"])
+
+    def rebuild(self, dtype=None):
+        """Rebuild force model and integrator after the config changed (warming up for dtype, default the particles' one)."""
+        if self.config.get("jit_warmup", False):
+            # Pay JIT compilation (or the cache load) here, not on the first step.
+            dtype = dtype or self.particles["pos"].dtype
+            warm_up(self.config, (str(dtype).replace("torch.", ""),))
+        self.model_fn = ForceCounter(build_force_pipeline(self.config))
+        self.integrator = get_integrator(self.config.get("integration_method", "verlet"))
+        for key in INTEGRATOR_HISTORY:
+            self.particles.pop(key, None)
+
+    def reset(self, particles=None):
+        """Start over from the configured preset (or the given particles)."""
+        self.particles = ParticleStore(particles if particles is not None else initialize_particles(self.config))
+        self.step_count = 0
+        self.time = 0.0
+        self.stats = {}
+        self.rebuild()
+        self._rotate_recording()
+
+    def _rotate_recording(self):
+        """
+        Continue an active recording in a new trajectory next to it (path_1,
+        path_2, ...): the step counter was reset, and the steps of one
+        trajectory only increase.
+        """
+        if self.recorder is not None:
+            self.start_recording(unused_trajectory_path(self.recorder.path))
+
+    def step(self, n=1):
+        """Advance n steps and return the stats of the last one."""
+        for _ in range(n):
+            self.particles, self.stats = simulation_step(self.particles, self.model_fn, self.integrator, self.config, self.step_count)
+            self.step_count += 1
+            self.time += self.config.get("timestep", 0.01)
+            if self.recorder is not None and self.recorder.wants(self.step_count):
+                self.recorder.push(self.step_count, self.time, self.particles)
+            every = self.config.get("checkpoint_every", 0)
+            if every and self.step_count % every == 0:
+                self.save_checkpoint()
+        return self.stats
+
+    def run(self, until=None, steps=None, callback=None):
+        """
+        Step until the simulated time reaches until and/or steps steps were taken.
+        Args:
+            until (float, optional): Simulated time to stop at.
+            steps (int, optional): Maximum number of steps.
+            callback (callable, optional): Called as callback(self) after every step;
+                returning False stops the run.
+        Returns:
+            dict: Stats of the last step.
+        """
+        if until is None and steps is None:
+            raise ValueError("run() needs until and/or steps")
+        taken = 0
+        while (until is None or self.time < until) and (steps is None or taken < steps):
+            self.step()
+            taken += 1
+            if callback is not None and callback(self) is False:
+                break
+        return self.stats
+
+    def add_particle(self, position, velocity, mass=1.0, color=(255, 255, 255)):
+        self.particles = add_particle(self.particles, position, velocity, mass, color)
+
+    def remove_particle(self, index):
+        self.particles = remove_particle(self.particles, index)
+
+    def remove_nearest(self, x, y):
+        """Remove the particle closest to (x, y) in the x/y plane; returns its index, or None if there is none."""
+        if self.num_particles == 0:
+            return None
+        pos = self.particles["pos"]
+        index = int(((pos[:, 0] - x) ** 2 + (pos[:, 1] - y) ** 2).argmin())
+        self.remove_particle(index)
+        return index
+
+    def add_many(self, pos, vel=None, mass=None, **fields):
+        return self.particles.add_many(pos, vel, mass, **fields)
+
+    def remove_many(self, indices):
+        self.particles.remove_many(indices)
+
+    def save_checkpoint(self, path=None):
+        """
+        Atomically write the full state (utils.checkpoint). Without a path it
+        goes to config["checkpoint_dir"]/step_<n>.ckpt, keeping the newest
+        config["checkpoint_keep"] files (0 keeps all). Returns the path.
+        """
+        directory = self.config.get("checkpoint_dir", None) or CHECKPOINT_DIR
+        path = path or checkpoint_path(directory, self.step_count)
+        with timed("checkpoint"):
+            save_checkpoint(path, self.particles, self.step_count, self.time, self.config)
+        if path == checkpoint_path(directory, self.step_count):
+            prune_checkpoints(directory, self.config.get("checkpoint_keep", 3))
+        return path
+
+    def resume_from(self, path):
+        """
+        Continue from a checkpoint file (or the newest one in a directory):
+        particles with their integrator history, step counter, time, RNG
+        states and the saved config. The particle tensors map the file and
+        are only read as they are used.
+        """
+        if os.path.isdir(path):
+            path = latest_checkpoint(path)
+            if path is None:
+                raise FileNotFoundError("no checkpoint to resume from")
+        device = self.particles["pos"].device if "pos" in self.particles else simulation_device(self.config)
+        state = load_checkpoint(path, device=None if device.type == "cpu" else device)
+        self.config.update({k: v for k, v in state["config"].items() if k not in RUN_CONTROL_KEYS})
+        # rebuild() drops integrator history, so it runs before the state is swapped in.
+        self.rebuild(state["particles"]["pos"].dtype)
+        self.particles = state["particles"]
+        self.step_count = state["step"]
+        self.time = state["time"]
+        self.stats = {}
+        self._rotate_recording()
+        return path
+
+    def start_recording(self, path=None):
+        """
+        Record pos/vel of every trajectory_every-th step (every trajectory_stride-th
+        particle, stored as trajectory_dtype) to a trajectory directory,
+        starting with the current state. Returns the path.
+        """
+        self.stop_recording()
+        path = path or default_trajectory_path()
+        self.recorder = TrajectoryWriter(
+            path,
+            every=self.config.get("trajectory_every", 1),
+            stride=self.config.get("trajectory_stride", 1),
+            dtype=self.config.get("trajectory_dtype", "float32"),
+        )
+        self.recorder.push(self.step_count, self.time, self.particles)
+        return path
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def close(self):
+        """Flush and close the trajectory recording and the step log this run started, if any."""
+        self.stop_recording()
+        if self.config.get("step_log", None):
+            stop_step_log()
+
+    def set_profiling(self, enabled=True):
+        """Turn the per-stage timers of utils.profiler on or off."""
+        set_timing(enabled)
+
+    def stage_summary(self):
+        """count/mean/p50/p95/max seconds per timed stage (force, tree_build, ...)."""
+        return stage_summary()
+
+    @property
+    def num_particles(self):
+        return self.particles.count
+
+    def frame(self):
+        """Render state of the current step; pos is a NumPy view for CPU tensors."""
+        color = self.particles.get("color", None)
+        return {
+            "pos": self.particles["pos"].detach().cpu().numpy(),
+            "color": None if color is None else color.cpu().numpy(),
+            "count": self.num_particles,
+            "step": self.step_count,
+            "time": self.time,
+            "stats": self.stats,
+        }
+
+class SimulationWorker:
+    """
+    Steps a Simulation on a background thread so physics and rendering run
+    at their own rates. After every step the positions are copied into a
+    free snapshot buffer, which then becomes the front one. frame() marks
+    the front buffer as being read for the duration of the with block, so
+    the lock is only held to take and release it. With three buffers there
+    is always one that is neither the front nor being read by a single
+    reader, so the worker never waits for the render.
+    Anything that changes the simulation from the UI side goes through
+    submit() and runs between steps.
+    """
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.paused = False
+        self._lock = threading.Condition()
+        self._commands = queue.Queue()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._single_step = False
+        self._thread = None
+        self.error = None
+        self._color = None
+        self._color_key = None
+        self._buffers = [self._empty() for _ in range(3)]
+        self._readers = [0, 0, 0]
+        self._front = 0
+        self._publish()
+
+    def _empty(self):
+        pos = np.empty((0, 3), dtype=np.float32)
+        return {"pos": pos, "view": pos, "color": None, "count": 0, "step": 0, "time": 0.0, "stats": {}}
+
+    def _free_buffer(self):
+        """Index of a buffer that is neither the front one nor being read (waits for one); call with the lock held."""
+        while True:
+            for i, readers in enumerate(self._readers):
+                if i != self._front and not readers:
+                    return i
+            self._lock.wait()
+
+    def _publish(self):
+        """Copy the current state into a free buffer and make it the front one."""
+        sim = self.sim
+        with self._lock:
+            index = self._free_buffer()
+        back = self._buffers[index]
+        n = sim.num_particles
+        if back["pos"].shape[0] < n:
+            back["pos"] = np.empty((max(n, 2 * back["pos"].shape[0]), 3), dtype=np.float32)
+        pos = back["pos"][:n]
+        pos[:] = sim.particles["pos"].detach().cpu().numpy()
+        color = sim.particles.get("color", None)
+        # Colors only change on add/remove/reset; a fresh array is shared by both buffers.
+        key = None if color is None else (n, color.data_ptr(), color._version)
+        if key != self._color_key:
+            self._color = None if color is None else color.cpu().numpy().copy()
+            self._color_key = key
+        back.update(color=self._color, count=n, step=sim.step_count, time=sim.time, stats=sim.stats, view=pos)
+        with self._lock:
+            self._front = index
+
+    @contextmanager
+    def frame(self):
+        """Yield the latest snapshot; valid only inside the with block."""
+        with self._lock:
+            index = self._front
+            self._readers[index] += 1
+        try:
+            front = self._buffers[index]
+            yield dict(front, pos=front["view"])
+        finally:
+            with self._lock:
+                self._readers[index] -= 1
+                self._lock.notify_all()
+
+    def submit(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the worker thread before the next step."""
+        self._commands.put((fn, args, kwargs))
+        self._wake.set()
+
+    def request_step(self):
+        """Advance one step while paused."""
+        self._single_step = True
+        self._wake.set()
+
+    def set_paused(self, paused):
+        self.paused = paused
+        self._wake.set()
+
+    def start(self):
+        # Launch Numba's thread pool from this (the owning) thread: when the
+        # TBB layer is first started on the physics thread, the interpreter
+        # hangs at exit once that thread has finished.
+        get_num_threads()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="physics", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        try:
+            self._loop()
+        except Exception as e:
+            # Keep the UI alive; it can show or re-raise worker.error.
+            self.error = e
+
+    def _loop(self):
+        while not self._stop.is_set():
+            changed = False
+            while not self._commands.empty():
+                fn, args, kwargs = self._commands.get()
+                fn(*args, **kwargs)
+                changed = True
+            if self.paused and not self._single_step:
+                if changed:
+                    self._publish()
+                self._wake.wait(0.1)
+                self._wake.clear()
+                continue
+            self._single_step = False
+            self.sim.step()
+            self._publish()
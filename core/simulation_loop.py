@@ -2,14 +2,14 @@ import pygame
 import sys
 import json
 import torch
-from core.initializer import initialize_particles
-from core.interaction_model import select_model
-from core.time_stepper import get_integrator
-from utils.logger import log_simulation_step
-from utils.system_monitor import get_system_stats
+from core.simulation import Simulation, SimulationWorker, add_particle, remove_particle, simulation_step
+from graphics.pygame_renderer import ParticleRenderer
+from utils.profiler import timed, record_stage, set_timing, timing_enabled, format_stage_summary
 import time
 import os
 import glob
+from contextlib import nullcontext
+from core.preset_catalog import get_catalog, PRESET_ROOT
 
 SETTINGS_LIST = [
     ("fps", int),
@@ -18,29 +18,26 @@ SETTINGS_LIST = [
     ("integration_method", str),
     ("interaction_model", str),
     ("preset", str),
+    ("renderer", str),
+    ("threaded_physics", bool),
 ]
 
 SETTINGS_OPTIONS = {
     "fps": [30, 60, 120],
     "particle_count": [9, 100, 1000, 10000],
     "gpu_mode": [True, False],
-    "integration_method": ["euler", "verlet", "rk4"],
-    "interaction_model": ["direct", "barnes_hut"],
-    "preset": []  # Will be filled dynamically
+    "integration_method": ["euler", "verlet", "leapfrog", "yoshida4", "rk4", "block"],
+    "interaction_model": ["direct", "direct_tiled", "barnes_hut", "barnes_hut_group", "fmm"],
+    "preset": [],  # Will be filled dynamically
+    "renderer": ["pygame", "vispy"],
+    "threaded_physics": [False, True],
 }
 
-PRESET_DIR = os.path.join(os.path.dirname(sys.argv[0]), "assets", "presets")
-USER_PRESET_DIR = os.path.join(PRESET_DIR, "user")
+USER_PRESET_DIR = os.path.join(PRESET_ROOT, "user")
 
 def get_all_presets():
-    preset_names = []
-    for folder in os.listdir(PRESET_DIR):
-        folder_path = os.path.join(PRESET_DIR, folder)
-        if os.path.isdir(folder_path):
-            for file in os.listdir(folder_path):
-                if file.endswith(".json"):
-                    preset_names.append(file[:-5])
-    return preset_names
+    """Preset names from the cached catalog (folders are rescanned only when their mtime changed)."""
+    return get_catalog().names()
 
 def save_config_to_file(config, config_path):
     # Only save relevant keys
@@ -54,63 +51,6 @@ def save_config_to_file(config, config_path):
     with open(config_path, "w") as f:
         f.writelines(lines)
 
-def add_particle(particles, position, velocity, mass=1.0, color=(255, 255, 255)):
-    """Add a new particle to the simulation."""
-    device = particles["pos"].device
-    dtype = particles["pos"].dtype
-    
-    # Convert inputs to tensors with matching device and dtype
-    pos_tensor = torch.tensor([position], dtype=dtype, device=device)
-    vel_tensor = torch.tensor([velocity], dtype=dtype, device=device)
-    mass_tensor = torch.tensor([[mass]], dtype=dtype, device=device)
-    
-    # Concatenate with existing particles
-    particles["pos"] = torch.cat([particles["pos"], pos_tensor], dim=0)
-    particles["vel"] = torch.cat([particles["vel"], vel_tensor], dim=0)
-    particles["mass"] = torch.cat([particles["mass"], mass_tensor], dim=0)
-    
-    # Handle color if present
-    if "color" in particles:
-        color_tensor = torch.tensor([color], dtype=torch.uint8, device="cpu")
-        particles["color"] = torch.cat([particles["color"], color_tensor], dim=0)
-    
-    # Handle names if present
-    if "names" in particles:
-        particles["names"].append(f"Particle_{len(particles['names'])}")
-    
-    return particles
-
-def remove_particle(particles, index):
-    """Remove a particle from the simulation by index."""
-    if index < 0 or index >= particles["pos"].shape[0]:
-        return particles  # Invalid index
-    
-    # Remove the particle at the specified index
-    particles["pos"] = torch.cat([particles["pos"][:index], particles["pos"][index+1:]], dim=0)
-    particles["vel"] = torch.cat([particles["vel"][:index], particles["vel"][index+1:]], dim=0)
-    particles["mass"] = torch.cat([particles["mass"][:index], particles["mass"][index+1:]], dim=0)
-    
-    # Handle color if present
-    if "color" in particles:
-        particles["color"] = torch.cat([particles["color"][:index], particles["color"][index+1:]], dim=0)
-    
-    # Handle names if present
-    if "names" in particles:
-        particles["names"] = particles["names"][:index] + particles["names"][index+1:]
-    
-    return particles
-
-def simulation_step(particles, model_fn, integrator, config, step):
-    """Perform a single simulation step."""
-    # Compute forces
-    forces = model_fn(particles)
-    # Integrate
-    particles = integrator(particles, forces, config)
-    # Log and monitor
-    stats = get_system_stats()
-    log_simulation_step(step, particles, stats)
-    return particles, stats
-
 def run_simulation(config):
     """Generator-based simulation loop that yields after each step."""
     import torch  # Import here to ensure it's available
@@ -121,23 +61,55 @@ def run_simulation(config):
     pygame.display.set_caption("PyVerse - Simulation")
     font = pygame.font.SysFont("Consolas", 20)
     clock = pygame.time.Clock()
+    renderer = ParticleRenderer()
     settings_idx = 0
     editing = False
     edit_buffer = ""
     running = True
-    step = 0
-    stats = {}
-    particles = initialize_particles(config)
-    model_fn = select_model(config.get("interaction_model", "direct"))
-    integrator = get_integrator(config.get("integration_method", "verlet"))
+    # The UI is one consumer of the headless engine.
+    sim = Simulation(config)
+    # With threaded_physics the engine steps on its own thread and the UI
+    # renders its snapshots; changes to the simulation are queued to it.
+    worker = None
+
+    def set_threaded(enabled):
+        nonlocal worker
+        if enabled and worker is None:
+            worker = SimulationWorker(sim)
+            worker.set_paused(paused)
+            worker.start()
+        elif not enabled and worker is not None:
+            worker.stop()
+            worker = None
+
+    def command(fn, *args, **kwargs):
+        if worker is not None:
+            worker.submit(fn, *args, **kwargs)
+        else:
+            fn(*args, **kwargs)
+
+    def on_setting_changed(key):
+        if key == "preset":
+            command(sim.reset)
+        elif key in ("integration_method", "interaction_model"):
+            command(sim.rebuild)
+        elif key == "threaded_physics":
+            set_threaded(config[key])
     # Update preset list dynamically
-    SETTINGS_OPTIONS["preset"] = get_all_presets() + ["random"]
+    SETTINGS_OPTIONS["preset"] = get_all_presets()
     
     # Simulation state
     paused = False
     single_step = False
+    set_threaded(config.get("threaded_physics", False))
+    error = None
     
     while running:
+        if worker is not None and worker.error is not None:
+            # The physics thread died; shut down and re-raise its exception.
+            error = worker.error
+            break
+        events_start = time.perf_counter()
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
@@ -146,9 +118,20 @@ def run_simulation(config):
                     running = False
                 elif event.key == pygame.K_F1:
                     editing = not editing
+                elif event.key == pygame.K_p:
+                    # Toggle the per-stage timers shown in the HUD
+                    set_timing(not timing_enabled())
+                elif event.key == pygame.K_r:
+                    # Start/stop recording a trajectory (utils.trajectory)
+                    command(sim.stop_recording if sim.recorder is not None else sim.start_recording)
+                elif event.key == pygame.K_k:
+                    # Write a checkpoint now (see checkpoint_every for periodic ones)
+                    command(sim.save_checkpoint)
                 elif event.key == pygame.K_SPACE:
                     # Toggle pause
                     paused = not paused
+                    if worker is not None:
+                        worker.set_paused(paused)
                 elif event.key == pygame.K_RIGHT and paused:
                     # Single step when paused
                     single_step = True
@@ -161,8 +144,8 @@ def run_simulation(config):
                     sim_z = 0.0  # Default to z=0 plane
                     # Random velocity
                     vel = [torch.randn(1).item() * 0.1 for _ in range(3)]
-                    particles = add_particle(
-                        particles, 
+                    command(
+                        sim.add_particle,
                         [sim_x, sim_y, sim_z], 
                         vel,
                         mass=torch.rand(1).item() * 10.0,
@@ -174,17 +157,12 @@ def run_simulation(config):
                     )
                 elif event.key == pygame.K_d:
                     # Remove particle closest to cursor
-                    if particles["pos"].shape[0] > 1:  # Ensure at least one particle remains
+                    if sim.num_particles > 1:  # Ensure at least one particle remains
                         pos = pygame.mouse.get_pos()
                         sim_x = (pos[0] - width // 2) * 1e9 / (width // 2)
                         sim_y = (pos[1] - height // 2) * 1e9 / (height // 2)
-                        
-                        # Find closest particle
-                        particle_pos = particles["pos"].cpu().numpy()
-                        distances = ((particle_pos[:, 0] - sim_x) ** 2 + 
-                                    (particle_pos[:, 1] - sim_y) ** 2) ** 0.5
-                        closest_idx = distances.argmin()
-                        particles = remove_particle(particles, closest_idx)
+                        # Searched when the command runs: queued commands may reorder rows first.
+                        command(sim.remove_nearest, sim_x, sim_y)
                 elif editing:
                     if event.key == pygame.K_UP:
                         settings_idx = (settings_idx - 1) % len(SETTINGS_LIST)
@@ -195,15 +173,13 @@ def run_simulation(config):
                         options = SETTINGS_OPTIONS[key]
                         idx = options.index(config.get(key, options[0]))
                         config[key] = options[(idx - 1) % len(options)]
-                        if key == "preset":
-                            particles = initialize_particles(config)
+                        on_setting_changed(key)
                     elif event.key == pygame.K_RIGHT:
                         key, typ = SETTINGS_LIST[settings_idx]
                         options = SETTINGS_OPTIONS[key]
                         idx = options.index(config.get(key, options[0]))
                         config[key] = options[(idx + 1) % len(options)]
-                        if key == "preset":
-                            particles = initialize_particles(config)
+                        on_setting_changed(key)
                     elif event.key == pygame.K_s:
                         # Save current config as a user preset
                         if not os.path.exists(USER_PRESET_DIR):
@@ -216,34 +192,49 @@ def run_simulation(config):
                         }
                         with open(preset_path, "w") as f:
                             json.dump(preset_data, f, indent=2)
+                        get_catalog(refresh=False).update(preset_path)
+                        SETTINGS_OPTIONS["preset"] = get_all_presets()
+        
+        record_stage("events", time.perf_counter() - events_start)
         
         # Update simulation if not paused or if single step requested
-        if not paused or single_step:
-            particles, stats = simulation_step(particles, model_fn, integrator, config, step)
-            step += 1
-            single_step = False  # Reset single step flag
+        if worker is not None:
+            if single_step:
+                worker.request_step()
+        elif not paused or single_step:
+            sim.step()
+        single_step = False  # Reset single step flag
         
         # Render (draw particles)
+        render_start = time.perf_counter()
         screen.fill((0, 0, 0))
-        pos = particles["pos"].cpu().numpy()
-        if "color" in particles:
-            color = particles["color"].numpy()
-        else:
-            color = [(255, 255, 255)] * pos.shape[0]
-        for i, p in enumerate(pos):
-            x = int(width // 2 + p[0] / 1e9 * (width // 2))
-            y = int(height // 2 + p[1] / 1e9 * (height // 2))
-            pygame.draw.circle(screen, tuple(color[i]), (x, y), 6 if config.get("preset") == "solar_system" else 2)
+        with (worker.frame() if worker is not None else nullcontext(sim.frame())) as state:
+            if config.get("renderer", "pygame") == "vispy":
+                # Particles go to the VisPy window; this screen keeps the HUD.
+                from graphics.vispy_renderer import render_scene
+                render_scene(state, config)
+            else:
+                renderer.draw(screen, state["pos"], state["color"], 6 if config.get("preset") == "solar_system" else 2)
+            stats = state["stats"]
+            step = state["step"]
+            count = state["count"]
+        record_stage("render", time.perf_counter() - render_start)
         
         # Overlay stats
+        hud_start = time.perf_counter()
         overlay_lines = [
             f"Step: {step}",
             f"FPS: {clock.get_fps():.2f}",
-            f"Particles: {particles['pos'].shape[0]}",
+            f"Particles: {count}",
             f"CPU: {stats.get('cpu', 0):.1f}% RAM: {stats.get('ram', 0):.1f}% GPU: {stats.get('gpu', 0):.1f}%",
-            f"Status: {'PAUSED' if paused else 'RUNNING'}",
-            "F1: Settings | SPACE: Pause/Resume | RIGHT: Step | A: Add | D: Delete | ESC: Quit"
+            f"RSS: {stats.get('rss_mb', 0):.0f} MB Threads: {stats.get('threads', 0)}",
+            f"Force evals/step: {stats.get('force_evals', 0):.2f}",
+            f"Step: {stats.get('step_time', 0) * 1e3:.2f} ms (forces {stats.get('force_time', 0) * 1e3:.2f} ms)",
+            f"Status: {'PAUSED' if paused else 'RUNNING'}{' | REC ' + sim.recorder.path if sim.recorder is not None else ''}",
+            "F1: Settings | SPACE: Pause/Resume | RIGHT: Step | A: Add | D: Delete | R: Record | K: Checkpoint | P: Profiler | ESC: Quit"
         ]
+        if timing_enabled():
+            overlay_lines += format_stage_summary()
         for i, line in enumerate(overlay_lines):
             text_surface = font.render(line, True, (255, 255, 255))
             screen.blit(text_surface, (20, 20 + i * 28))
@@ -268,19 +259,25 @@ def run_simulation(config):
             # Show save instructions
             save_text = font.render("S: Save as user preset", True, (200, 255, 200))
             screen.blit(save_text, (width - 380, height - 60))
+        record_stage("hud", time.perf_counter() - hud_start)
         
-        pygame.display.flip()
+        with timed("present"):
+            pygame.display.flip()
         clock.tick(config.get("fps", 60))
         
         # Yield current state to allow external control
         yield {
-            "particles": particles,
+            "particles": sim.particles,
             "stats": stats,
             "step": step,
             "paused": paused
         }
     
+    set_threaded(False)
+    sim.close()
     # Save config on quit
     config_path = os.path.join(os.path.dirname(__file__), "..", "config.py")
     save_config_to_file(config, config_path)
     pygame.quit()
+    if error is not None:
+        raise error
@@ -1,32 +1,190 @@
+import time
 import torch
 
-def euler(particles, forces, config):
+# Yoshida (1990) 4th-order composition weights.
+_CBRT2 = 2.0 ** (1.0 / 3.0)
+_YOSHIDA_W1 = 1.0 / (2.0 - _CBRT2)
+_YOSHIDA_W0 = -_CBRT2 * _YOSHIDA_W1
+
+# Block timesteps: bin b advances with timestep / 2**b.
+DEFAULT_BLOCK_BINS = 8
+DEFAULT_BLOCK_ETA = 0.02
+
+
+class ForceCounter:
+    """
+    Wraps a force model and counts how many times it is evaluated.
+    particle_evaluations counts the forces actually computed, so an evaluation
+    restricted to a subset of targets only counts for those particles.
+    seconds accumulates the wall time spent inside the model.
+    """
+
+    def __init__(self, model_fn):
+        self.model_fn = model_fn
+        self.evaluations = 0
+        self.particle_evaluations = 0
+        self.seconds = 0.0
+
+    def __call__(self, particles, targets=None):
+        self.evaluations += 1
+        start = time.perf_counter()
+        if targets is None:
+            self.particle_evaluations += particles["pos"].shape[0]
+            forces = self.model_fn(particles)
+        else:
+            self.particle_evaluations += targets.shape[0]
+            forces = self.model_fn(particles, targets=targets)
+        self.seconds += time.perf_counter() - start
+        return forces
+
+
+def _evaluate(model_fn, particles, pos, vel):
+    """Evaluate the force model at an intermediate state without touching particles."""
+    state = dict(particles)
+    state["pos"] = pos
+    state["vel"] = vel
+    return model_fn(state)
+
+
+def euler(particles, forces, config, model_fn=None):
     dt = config.get("timestep", 0.01)
     particles["vel"] += forces * dt / particles["mass"]
     particles["pos"] += particles["vel"] * dt
     return particles
 
-def verlet(particles, forces, config):
+def verlet(particles, forces, config, model_fn=None):
     dt = config.get("timestep", 0.01)
     if "prev_pos" not in particles:
         particles["prev_pos"] = particles["pos"] - particles["vel"] * dt
     new_pos = 2 * particles["pos"] - particles["prev_pos"] + (forces / particles["mass"]) * dt * dt
+    # Central difference keeps vel consistent with the positions.
+    particles["vel"] = (new_pos - particles["prev_pos"]) / (2 * dt)
     particles["prev_pos"] = particles["pos"]
     particles["pos"] = new_pos
     return particles
 
-def rk4(particles, forces, config):
-    # Simplified RK4 for demonstration
+def leapfrog(particles, forces, config, model_fn=None):
+    """
+    Kick-drift-kick leapfrog. The forces at the end of the step are stored in
+    particles["next_forces"] so the next step does not evaluate them again.
+    """
     dt = config.get("timestep", 0.01)
-    acc = forces / particles["mass"]
-    particles["vel"] += acc * dt
+    mass = particles["mass"]
+    particles["vel"] += forces * (0.5 * dt) / mass
     particles["pos"] += particles["vel"] * dt
+    forces = model_fn(particles)
+    particles["vel"] += forces * (0.5 * dt) / mass
+    particles["next_forces"] = forces
+    return particles
+
+def yoshida4(particles, forces, config, model_fn=None):
+    """4th-order Yoshida integrator: three leapfrog substeps with weights w1, w0, w1."""
+    dt = config.get("timestep", 0.01)
+    mass = particles["mass"]
+    for w in (_YOSHIDA_W1, _YOSHIDA_W0, _YOSHIDA_W1):
+        particles["vel"] += forces * (0.5 * w * dt) / mass
+        particles["pos"] += particles["vel"] * (w * dt)
+        forces = model_fn(particles)
+        particles["vel"] += forces * (0.5 * w * dt) / mass
+    particles["next_forces"] = forces
+    return particles
+
+def rk4(particles, forces, config, model_fn=None):
+    """Classical 4th-order Runge-Kutta on (pos, vel) with four force evaluations."""
+    dt = config.get("timestep", 0.01)
+    mass = particles["mass"]
+    pos = particles["pos"]
+    vel = particles["vel"]
+    k1x = vel
+    k1v = forces / mass
+    k2x = vel + k1v * (0.5 * dt)
+    k2v = _evaluate(model_fn, particles, pos + k1x * (0.5 * dt), k2x) / mass
+    k3x = vel + k2v * (0.5 * dt)
+    k3v = _evaluate(model_fn, particles, pos + k2x * (0.5 * dt), k3x) / mass
+    k4x = vel + k3v * dt
+    k4v = _evaluate(model_fn, particles, pos + k3x * dt, k4x) / mass
+    particles["pos"] = pos + (k1x + 2 * k2x + 2 * k3x + k4x) * (dt / 6)
+    particles["vel"] = vel + (k1v + 2 * k2v + 2 * k3v + k4v) * (dt / 6)
     return particles
 
+def _block_bins(acc, jerk, dt, max_bins, eta):
+    """Power-of-two bin for each particle from the criterion dt_i = eta * |a| / |j|."""
+    a = torch.linalg.vector_norm(acc, dim=1)
+    j = torch.linalg.vector_norm(jerk, dim=1)
+    dt_i = eta * a / j.clamp_min(torch.finfo(acc.dtype).tiny)
+    bins = torch.ceil(torch.log2(dt / dt_i.clamp_min(torch.finfo(acc.dtype).tiny)))
+    return bins.nan_to_num(0).clamp(0, max_bins).to(torch.int64)
+
+def block_leapfrog(particles, forces, config, model_fn=None):
+    """
+    Hierarchical (block) timestep leapfrog over one global timestep.
+    Every particle lives in a power-of-two bin chosen from its acceleration
+    and jerk; all particles drift on every substep but forces are only
+    recomputed, and kicks only applied, for the bins that are due. Bins are
+    kept in particles["dt_bin"] and all particles are synchronized again at
+    the end of the step. Tree and FMM models still rebuild their tree from
+    every particle on each substep; only the walk is limited to the due bins.
+    """
+    dt = config.get("timestep", 0.01)
+    max_bins = config.get("block_max_bins", DEFAULT_BLOCK_BINS)
+    eta = config.get("block_eta", DEFAULT_BLOCK_ETA)
+    mass = particles["mass"]
+    n = particles["pos"].shape[0]
+    device = particles["pos"].device
+    total_ticks = 1 << max_bins
+    tick = dt / total_ticks
+    acc = forces / mass
+    bins = particles.get("dt_bin", None)
+    if bins is None or bins.shape[0] != n:
+        # First step: estimate the jerk from one evaluation a tick ahead.
+        probe = _evaluate(model_fn, particles, particles["pos"] + particles["vel"] * tick, particles["vel"]) / mass
+        bins = _block_bins(acc, (probe - acc) / tick, dt, max_bins, eta)
+    length = 1 << (max_bins - bins)
+    particles["vel"] += acc * (0.5 * tick * length).unsqueeze(1).to(acc.dtype)
+    t = 0
+    while t < total_ticks:
+        step_ticks = int(length.min())
+        particles["pos"] += particles["vel"] * (step_ticks * tick)
+        t += step_ticks
+        active = torch.nonzero(t % length == 0).flatten()
+        new_acc = model_fn(particles, targets=active) / mass[active]
+        old_length = length[active]
+        half_old = (0.5 * tick * old_length).unsqueeze(1).to(acc.dtype)
+        particles["vel"][active] += new_acc * half_old
+        jerk = (new_acc - acc[active]) / (tick * old_length).unsqueeze(1).to(acc.dtype)
+        new_bins = _block_bins(new_acc, jerk, dt, max_bins, eta)
+        # Coarsen by at most one level, and only onto a tick the coarser bin hits.
+        new_bins = torch.maximum(new_bins, bins[active] - 1)
+        coarse = new_bins < bins[active]
+        aligned = t % (1 << (max_bins - new_bins)) == 0
+        new_bins = torch.where(coarse & ~aligned, bins[active], new_bins)
+        bins[active] = new_bins
+        length[active] = 1 << (max_bins - new_bins)
+        acc[active] = new_acc
+        if t < total_ticks:
+            particles["vel"][active] += new_acc * (0.5 * tick * length[active]).unsqueeze(1).to(acc.dtype)
+    particles["dt_bin"] = bins
+    # Every particle was active on the last substep, so acc is current.
+    particles["next_forces"] = acc * mass
+    return particles
+
+def integrate_step(particles, model_fn, integrator, config):
+    """Advance one step, reusing forces left in particles by the previous step."""
+    forces = particles.pop("next_forces", None)
+    if forces is None or forces.shape != particles["pos"].shape:
+        forces = model_fn(particles)
+    return integrator(particles, forces, config, model_fn)
+
 def get_integrator(name):
     if name == "verlet":
         return verlet
+    elif name == "leapfrog":
+        return leapfrog
+    elif name == "yoshida4":
+        return yoshida4
     elif name == "rk4":
         return rk4
+    elif name == "block":
+        return block_leapfrog
     else:
-        return euler
\ No newline at end of file
+        return euler
@@ -0,0 +1,108 @@
+# pygame_renderer.py
+# Vectorized particle renderer for the Pygame simulation view.
+# Projects all positions with NumPy and writes packed pixels straight into
+# the surface, switching to density rendering for large N.
+
+import numpy as np
+import pygame
+
+# Above this many particles every particle is a single pixel whose
+# brightness shows how many particles landed on it.
+DENSITY_THRESHOLD = 20000
+
+def project_positions(pos, width, height, scale=1e9):
+    """
+    Project simulation coordinates onto the screen (x/y plane, z ignored).
+    Args:
+        pos (np.ndarray): (N, 3) positions.
+        width, height (int): Screen size in pixels.
+        scale (float): Distance from the centre to the screen edge.
+    Returns:
+        tuple: Integer pixel columns and rows, both (N,).
+    """
+    half_w = width // 2
+    half_h = height // 2
+    x = (half_w + pos[:, 0] * (half_w / scale)).astype(np.int64)
+    y = (half_h + pos[:, 1] * (half_h / scale)).astype(np.int64)
+    return x, y
+
+def _disc_offsets(radius):
+    r = np.arange(-radius, radius + 1)
+    dx, dy = np.meshgrid(r, r, indexing="ij")
+    inside = dx * dx + dy * dy <= radius * radius
+    return dx[inside], dy[inside]
+
+def _pack(surface, rgb):
+    """Pack (N, 3) uint8 colors into the surface's 32-bit pixel format."""
+    r_shift, g_shift, b_shift, _ = surface.get_shifts()
+    rgb = rgb.astype(np.uint32)
+    return (rgb[:, 0] << r_shift) | (rgb[:, 1] << g_shift) | (rgb[:, 2] << b_shift)
+
+class ParticleRenderer:
+    """
+    Draws particles onto a cleared Pygame surface with NumPy writes through
+    pygame.surfarray.pixels2d instead of one draw call per particle. Up to
+    density_threshold particles are drawn as filled discs of the given
+    radius; above it each particle is one pixel whose brightness follows
+    log(1 + particles on that pixel).
+    """
+
+    def __init__(self, scale=1e9, density_threshold=DENSITY_THRESHOLD):
+        self.scale = scale
+        self.density_threshold = density_threshold
+        self._offsets = {}
+        self._canvas = None
+
+    def _points(self, pixels, x, y, packed, radius):
+        width, height = pixels.shape
+        if radius not in self._offsets:
+            self._offsets[radius] = _disc_offsets(radius)
+        for dx, dy in zip(*self._offsets[radius]):
+            px = x + dx
+            py = y + dy
+            visible = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+            pixels[px[visible], py[visible]] = packed[visible]
+
+    def _density(self, surface, pixels, x, y, rgb):
+        width, height = pixels.shape
+        visible = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+        x = x[visible]
+        y = y[visible]
+        if x.size == 0:
+            return
+        counts = np.bincount(x * height + y, minlength=width * height)
+        hits = counts[x * height + y]
+        # Log tone mapping keeps sparse regions visible next to dense cores.
+        peak = max(int(hits.max()), 2)
+        lut = (0.25 + 0.75 * np.log1p(np.arange(peak + 1)) / np.log1p(peak)).astype(np.float32)
+        shaded = (rgb[visible] * lut[hits][:, None]).astype(np.uint8)
+        pixels[x, y] = _pack(surface, shaded)
+
+    def draw(self, surface, pos, color=None, radius=2):
+        """
+        Draw the particles at pos (N, 3) with colors (N, 3) onto surface.
+        The surface is expected to be cleared already.
+        """
+        n = pos.shape[0]
+        if n == 0:
+            return
+        target = surface
+        if surface.get_bytesize() != 4:
+            # pixels2d needs a 32-bit surface; draw on one and blit it over.
+            if self._canvas is None or self._canvas.get_size() != surface.get_size():
+                self._canvas = pygame.Surface(surface.get_size(), 0, 32)
+            self._canvas.blit(surface, (0, 0))
+            target = self._canvas
+        width, height = target.get_size()
+        x, y = project_positions(pos, width, height, self.scale)
+        rgb = np.full((n, 3), 255, dtype=np.uint8) if color is None else np.asarray(color, dtype=np.uint8).reshape(n, 3)
+        pixels = pygame.surfarray.pixels2d(target)
+        try:
+            if n > self.density_threshold:
+                self._density(target, pixels, x, y, rgb)
+            else:
+                self._points(pixels, x, y, _pack(target, rgb), radius)
+        finally:
+            del pixels  # Unlock the surface
+        if target is not surface:
+            surface.blit(target, (0, 0))
@@ -8,9 +8,8 @@ import json
 import os
 import glob
 from config import CONFIG
-from core.simulation_loop import run_simulation
-from graphics.vispy_renderer import render_scene
 from utils.system_monitor import get_system_stats
+from core.preset_catalog import get_catalog, thumbnail_pixels, PRESET_ROOT
 
 def draw_overlay(screen, font, stats, fps):
     """
@@ -124,6 +123,19 @@ def show_preset_management(screen, font, presets, selected_idx):
         color = (255, 255, 255) if i == selected_idx else (180, 180, 180)
         text = font.render(preset, True, color)
         overlay.blit(text, (60, 100 + i * 32))
+    # Details of the selected preset from the catalog (nothing is parsed here)
+    info = get_catalog(refresh=False).info(presets[selected_idx]) if presets else None
+    if info:
+        x = overlay.get_width() - 260
+        details = [f"Bodies: {info.get('bodies', 0)}", f"Total mass: {info.get('total_mass', 0.0):.3g} kg"]
+        if info.get("generator"):
+            details.append(f"Generator: {info['generator']}")
+        for j, line in enumerate(details):
+            overlay.blit(font.render(line, True, (200, 200, 255)), (x, 100 + j * 28))
+        pixels = thumbnail_pixels(info)
+        if pixels is not None:
+            thumb = pygame.surfarray.make_surface(pixels.T.repeat(3).reshape(pixels.shape[1], pixels.shape[0], 3))
+            overlay.blit(pygame.transform.scale(thumb, (192, 192)), (x, 110 + len(details) * 28))
     screen.blit(overlay, (0, 0))
 
 def get_all_presets():
@@ -132,11 +144,8 @@ def get_all_presets():
     Returns:
         list: List of preset names (str).
     """
-    preset_paths = glob.glob(os.path.join('assets', 'presets', 'Default', '*.json'))
-    user_paths = glob.glob(os.path.join('assets', 'presets', 'user', '*.json'))
-    preset_names = [os.path.splitext(os.path.basename(p))[0] for p in preset_paths]
-    user_names = [os.path.splitext(os.path.basename(p))[0] for p in user_paths]
-    return preset_names + user_names
+    # The catalog only rescans folders whose mtime changed since the last call.
+    return get_catalog().names()
 
 def prompt_for_preset_name(screen, font):
     """
@@ -183,6 +192,9 @@ def show_main_menu(config=None):
     Main simulation menu loop. Handles simulation, overlays, and user input.
     Accepts a config dict to allow launching with a selected preset.
     """
+    # Heavy backends (torch, Numba kernels, VisPy) load here, not with the menu.
+    from core.simulation_loop import run_simulation
+    from graphics.vispy_renderer import render_scene
     pygame.init()
     import os
     os.environ['SDL_VIDEO_MINIMIZE_ON_FOCUS_LOSS'] = '0'
@@ -199,7 +211,7 @@ def show_main_menu(config=None):
     show_help = False
     show_presets = False
     show_settings = False
-    presets = get_all_presets() + ["random"]
+    presets = get_all_presets()
     preset_idx = 0
     while running:
         for event in pygame.event.get():
@@ -243,7 +255,7 @@ def show_main_menu(config=None):
                     # Save preset: prompt for name, only save if user confirms
                     preset_name = prompt_for_preset_name(screen, font)
                     if preset_name:
-                        user_dir = os.path.join('assets', 'presets', 'user')
+                        user_dir = os.path.join(PRESET_ROOT, 'user')
                         if not os.path.exists(user_dir):
                             os.makedirs(user_dir)
                         preset_path = os.path.join(user_dir, preset_name + '.json')
@@ -251,7 +263,8 @@ def show_main_menu(config=None):
                         with open(preset_path, 'w') as f:
                             json.dump(CONFIG, f, indent=2)
                         # Update preset list
-                        presets = get_all_presets() + ["random"]
+                        get_catalog(refresh=False).update(preset_path)
+                        presets = get_all_presets()
                 elif event.key == pygame.K_n:
                     step_requested = True
                 elif event.key == pygame.K_UP and show_presets:
@@ -320,6 +333,7 @@ def launch_menu(config):
     clock = pygame.time.Clock()
     menu_items = [
         ("Start Simulation", "start"),
+        ("Play Recording", "playback"),
         ("Run Benchmark", "benchmark"),
         ("Run Stress Test", "stress"),
         ("Presets", "presets"),
@@ -330,7 +344,7 @@ def launch_menu(config):
     running = True
     show_help = False
     show_presets = False
-    presets = get_all_presets() + ["random"]
+    presets = get_all_presets()
     preset_idx = 0
     while running:
         screen.fill((10, 10, 30))
@@ -376,24 +390,27 @@ def launch_menu(config):
                             pygame.quit()
                             show_main_menu(config)  # Pass config to show_main_menu
                             return None
+                        elif action == "playback":
+                            pygame.quit()
+                            # Replay the newest recorded trajectory (R in a running simulation records one)
+                            from core.playback import run_playback
+                            for _ in run_playback(config):
+                                pass
+                            return None
                         elif action == "benchmark":
-                            config_bench = config.copy()
-                            config_bench["benchmark_mode"] = True
                             pygame.quit()
-                            # Run simulation in benchmark mode
-                            sim_generator = run_simulation(config_bench)
-                            for _ in sim_generator:
-                                pass  # Run to completion
+                            # Headless benchmark grid, compared with the stored baseline if there is one
+                            from utils.benchmark import run_benchmark_suite, BASELINE_PATH
+                            run_benchmark_suite(baseline=BASELINE_PATH if os.path.exists(BASELINE_PATH) else None)
                             print("Benchmark completed.")
                             return None
                         elif action == "stress":
                             config_stress = config.copy()
                             config_stress["stress_test"] = True
                             pygame.quit()
-                            # Run simulation in stress test mode
-                            sim_generator = run_simulation(config_stress)
-                            for _ in sim_generator:
-                                pass  # Run to completion
+                            # Ramp N per interaction model until the frame budget breaks
+                            from utils.stress_tester import run_stress_test
+                            run_stress_test(config_stress, target_steps_per_second=config.get("fps", 60))
                             print("Stress test completed.")
                             return None
                         elif action == "help":
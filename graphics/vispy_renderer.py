@@ -1,4 +1,162 @@
+# vispy_renderer.py
+# OpenGL particle renderer built on vispy.gloo.
+# Positions live in a persistent vertex buffer that only receives the
+# position array each frame; colors and sizes are uploaded when they change.
+
+import numpy as np
+import torch
+from vispy import app, gloo
+
+VERTEX_SHADER = """
+uniform float u_scale;
+uniform vec2 u_aspect;
+attribute vec3 a_position;
+attribute vec3 a_color;
+attribute float a_size;
+varying vec3 v_color;
+void main() {
+    // Same x/y projection as the Pygame view (screen y points down there).
+    gl_Position = vec4(a_position.x * u_scale * u_aspect.x, -a_position.y * u_scale * u_aspect.y, 0.0, 1.0);
+    // Unused buffer slots have size 0 and are moved out of the clip volume.
+    if (a_size <= 0.0)
+        gl_Position = vec4(2.0, 2.0, 2.0, 1.0);
+    gl_PointSize = a_size;
+    v_color = a_color;
+}
+"""
+
+FRAGMENT_SHADER = """
+varying vec3 v_color;
+void main() {
+    vec2 d = gl_PointCoord - vec2(0.5);
+    if (dot(d, d) > 0.25)
+        discard;
+    gl_FragColor = vec4(v_color, 1.0);
+}
+"""
+
+_MIN_CAPACITY = 1024
+
+def as_numpy(values, dtype=np.float32):
+    """
+    NumPy view of a tensor or array for upload. CPU tensors of the right dtype
+    are shared without a copy; anything else is converted once.
+    """
+    if isinstance(values, torch.Tensor):
+        values = values.detach()
+        if values.device.type != "cpu":
+            values = values.cpu()
+        values = values.numpy()
+    return np.ascontiguousarray(values, dtype=dtype)
+
+def _unit_colors(color):
+    """(N, 3) float32 colors in [0, 1] from uint8 RGB or float RGB(A) values."""
+    if isinstance(color, torch.Tensor):
+        floating = color.is_floating_point()
+    else:
+        floating = np.issubdtype(np.asarray(color).dtype, np.floating)
+    values = as_numpy(color)[:, :3]
+    return np.ascontiguousarray(values if floating else values / 255.0, dtype=np.float32)
+
+def _change_key(values, count):
+    """Cheap identity of an array's contents; torch bumps _version on in-place writes."""
+    if values is None:
+        return (count, None)
+    if isinstance(values, torch.Tensor):
+        return (count, values.data_ptr(), values._version)
+    return (count, id(values))
+
+class VispyRenderer(app.Canvas):
+    """
+    Point renderer on a gloo.Program with persistent vertex buffers.
+    The buffers grow by doubling; vertices past the particle count get size 0
+    and are clipped, so a shrinking system never needs a reallocation. Mouse wheel zooms.
+    """
+
+    def __init__(self, scale=1e9, point_size=4.0, size=(1280, 720)):
+        app.Canvas.__init__(self, title="PyVerse - VisPy", size=size, keys="interactive")
+        self.program = gloo.Program(VERTEX_SHADER, FRAGMENT_SHADER)
+        self.program["u_scale"] = 1.0 / scale
+        self.point_size = point_size
+        self.capacity = 0
+        self.count = 0
+        self._color_key = None
+        self._size_key = None
+        self._reserve(_MIN_CAPACITY)
+        self._set_aspect()
+        self.show()
+
+    def _reserve(self, needed):
+        if needed <= self.capacity:
+            return
+        self.capacity = max(needed, 2 * self.capacity)
+        self._positions = gloo.VertexBuffer(np.zeros((self.capacity, 3), dtype=np.float32))
+        self._colors = gloo.VertexBuffer(np.ones((self.capacity, 3), dtype=np.float32))
+        self._sizes = gloo.VertexBuffer(np.zeros(self.capacity, dtype=np.float32))
+        self.program["a_position"] = self._positions
+        self.program["a_color"] = self._colors
+        self.program["a_size"] = self._sizes
+        self._color_key = None
+        self._size_key = None
+
+    def _set_aspect(self):
+        width, height = self.physical_size
+        # Keep the pixels square: the shorter side spans the full scale.
+        self.program["u_aspect"] = (min(width, height) / max(width, 1), min(width, height) / max(height, 1))
+
+    def update_particles(self, pos, color=None, sizes=None):
+        """
+        Upload a new frame. pos is (N, 3); color (N, 3) uint8 (or float
+        RGB(A) in [0, 1]) and sizes (N,) are only uploaded when their
+        contents or N changed.
+        """
+        n = pos.shape[0]
+        self._reserve(n)
+        if n:
+            # gloo sends the data at draw time; copy it, since pos may be a
+            # live view the physics thread keeps writing to.
+            self._positions.set_subdata(as_numpy(pos), copy=True)
+        color_key = _change_key(color, n)
+        if color_key != self._color_key:
+            if color is not None and n:
+                self._colors.set_subdata(_unit_colors(color))
+            elif n:
+                self._colors.set_subdata(np.ones((n, 3), dtype=np.float32))
+            self._color_key = color_key
+        size_key = _change_key(sizes, n)
+        if size_key != self._size_key or n != self.count:
+            values = np.zeros(self.capacity, dtype=np.float32)
+            values[:n] = self.point_size if sizes is None else as_numpy(sizes)
+            self._sizes.set_data(values)
+            self._size_key = size_key
+        self.count = n
+        self.update()
+
+    def on_resize(self, event):
+        gloo.set_viewport(0, 0, *event.physical_size)
+        self._set_aspect()
+
+    def on_mouse_wheel(self, event):
+        self.program["u_scale"] = self.program["u_scale"] * 1.1 ** event.delta[1]
+        self.update()
+
+    def on_draw(self, event):
+        gloo.set_state(clear_color="black", blend=False)
+        gloo.clear()
+        if self.count:
+            self.program.draw("points")
+
+_RENDERER = None
+
 def render_scene(particles, config):
-    # Placeholder: In a real system, use VisPy for 3D rendering
-    # For now, do nothing (window is handled by Pygame for menu)
-    pass
+    """
+    Draw one frame with the VisPy backend when config["renderer"] is "vispy".
+    The canvas is created on first use and kept for later frames.
+    """
+    global _RENDERER
+    if config.get("renderer", "pygame") != "vispy" or "pos" not in particles:
+        return
+    if _RENDERER is None:
+        _RENDERER = VispyRenderer(point_size=12.0 if config.get("preset") == "solar_system" else 4.0)
+    _RENDERER.update_particles(particles["pos"], particles.get("color", None), particles.get("size", None))
+    app.process_events()
@@ -1,25 +1,27 @@
-from vispy import scene, app
+from vispy import app
 import numpy as np
+from graphics.vispy_renderer import VispyRenderer
 
-class ParticleViewer(app.Canvas):
-    def __init__(self, positions, sizes, colors):
-        app.Canvas.__init__(self, keys='interactive', size=(800, 600))
-        self.unfreeze()
-        self.view = scene.SceneCanvas(keys='interactive', show=True)
-        self.scatter = scene.visuals.Markers()
-        self.view.central_widget.add_widget(self.scatter)
-        self.scatter.set_data(positions, face_color=colors, size=sizes)
-        self.camera = scene.cameras.TurntableCamera(fov=45, azimuth=30, elevation=30)
-        self.view.central_widget.add_widget(self.scatter)
-        self.view.camera = self.camera
-        self.show()
+class ParticleViewer(VispyRenderer):
+    """
+    Standalone point viewer on the same persistent gloo buffers as
+    render_scene: each update sends the positions and re-sends sizes and
+    colors only when they changed.
+    """
+
+    def __init__(self, positions, sizes, colors, scale=None):
+        positions = np.asarray(positions, dtype=np.float32)
+        if scale is None:
+            scale = float(np.abs(positions).max()) if positions.size else 1.0
+        VispyRenderer.__init__(self, scale=scale or 1.0, size=(800, 600))
+        self.update_particles(positions, sizes, colors)
 
     def update_particles(self, positions, sizes, colors):
-        self.scatter.set_data(positions, face_color=colors, size=sizes)
+        VispyRenderer.update_particles(self, positions, colors, sizes)
 
 # Example usage:
 # positions = np.random.normal(size=(100, 3))
 # sizes = np.full(100, 5)
 # colors = np.ones((100, 4))
 # viewer = ParticleViewer(positions, sizes, colors)
-# app.run()
\ No newline at end of file
+# app.run()
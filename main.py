@@ -1,15 +1,57 @@
 import sys
+import argparse
 from config import CONFIG
-from graphics.pygame_ui import launch_menu
-from core.simulation_loop import run_simulation
+
+def run_headless(config, steps):
+    """Run the engine without any window and print the stats at the end."""
+    from core.simulation import Simulation
+    sim = Simulation(dict(config))
+    stats = sim.run(steps=steps)
+    sim.close()
+    print(f"Steps: {sim.step_count} Time: {sim.time:.4g} Particles: {sim.num_particles}")
+    print(stats)
 
 def main():
+    parser = argparse.ArgumentParser(description="PyVerse galaxy simulator")
+    parser.add_argument("--headless", type=int, metavar="STEPS", help="Run STEPS steps without display")
+    parser.add_argument("--benchmark", action="store_true", help="Run the headless benchmark suite")
+    parser.add_argument("--baseline", help="Benchmark results to compare against")
+    parser.add_argument("--record", metavar="PATH", help="Record the trajectory to this directory")
+    parser.add_argument("--resume", metavar="PATH", help="Resume from a checkpoint file or directory")
+    parser.add_argument("--checkpoint-every", type=int, metavar="STEPS", help="Write a checkpoint every STEPS steps")
+    parser.add_argument("--play", nargs="?", const="", metavar="PATH", help="Play back a recorded trajectory (the newest by default)")
+    parser.add_argument("--stress", type=float, metavar="STEPS_PER_SEC", help="Find the largest N per model sustaining this step rate")
+    args = parser.parse_args()
+    if args.record:
+        CONFIG["trajectory"] = args.record
+    if args.resume:
+        CONFIG["resume_from"] = args.resume
+    if args.checkpoint_every:
+        CONFIG["checkpoint_every"] = args.checkpoint_every
+    if args.benchmark:
+        from utils.benchmark import run_benchmark_suite
+        results = run_benchmark_suite(baseline=args.baseline)
+        sys.exit(1 if results["regressions"] else 0)
+    if args.stress is not None:
+        from utils.stress_tester import run_stress_test
+        run_stress_test(CONFIG, target_steps_per_second=args.stress)
+        return
+    if args.play is not None:
+        from core.playback import run_playback
+        for _ in run_playback(CONFIG, args.play or None):
+            pass
+        return
+    if args.headless is not None:
+        run_headless(CONFIG, args.headless)
+        return
+    from graphics.pygame_ui import launch_menu
     # Launch menu and get user config
     user_config = launch_menu(CONFIG)
     if user_config is None:
         print("Exited from menu.")
         sys.exit(0)
-    # Start simulation
+    # Start simulation (torch, Numba and the kernels load only now)
+    from core.simulation_loop import run_simulation
     run_simulation(user_config)
 
 if __name__ == "__main__":
@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter: the hang only shows at interpreter exit.
+SCRIPT = """
+import time
+from config import CONFIG
+from core.simulation import Simulation, SimulationWorker
+config = dict(CONFIG, preset="random", particle_count=500, gpu_mode=False, interaction_model="{model}",
+              physics={{"gravity": True}}, trajectory=None, resume_from=None, step_log=None, jit_warmup=False)
+sim = Simulation(config)
+worker = SimulationWorker(sim)
+worker.start()
+while sim.step_count < 3 and worker.error is None:
+    time.sleep(0.05)
+worker.stop()
+sim.close()
+assert worker.error is None, worker.error
+print("steps", sim.step_count)
+"""
+
+def _run_worker(model):
+    return subprocess.run([sys.executable, "-c", SCRIPT.format(model=model)], cwd=ROOT,
+                          capture_output=True, text=True, timeout=120)
+
+def test_worker_process_exits_direct():
+    result = _run_worker("direct")
+    assert result.returncode == 0, result.stderr
+    assert "steps" in result.stdout
+
+def test_worker_process_exits_after_numba_parallel_model():
+    result = _run_worker("barnes_hut")
+    assert result.returncode == 0, result.stderr
+    assert "steps" in result.stdout
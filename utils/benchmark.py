@@ -1,23 +1,384 @@
-def run_benchmark():
+def run_fmm_accuracy_report(n=5000, orders=(1, 2, 3, 4, 6, 8), theta=0.7, seed=0):
+    """
+    Compare FMM forces of several expansion orders against direct summation.
+    Args:
+        n (int): Number of particles in the random Plummer-like test cluster.
+        orders (tuple): Expansion orders to evaluate.
+        theta (float): FMM opening angle.
+        seed (int): Random seed for the test cluster.
+    Returns:
+        list: One dict per order with median/p99/max relative force error and timings.
+    """
     import time
-    from config import CONFIG
-    from core.simulation_loop import run_simulation
-    from utils.logger import setup_logger
+    import torch
+    from core.physics_engine.fmm import compute_fmm_forces
+    from core.physics_engine.gravity import compute_direct_gravity
+
+    gen = torch.Generator().manual_seed(seed)
+    pos = torch.randn((n, 3), generator=gen, dtype=torch.float64)
+    pos = pos / pos.norm(dim=1, keepdim=True) * torch.rand((n, 1), generator=gen, dtype=torch.float64) ** 2
+    mass = torch.rand((n, 1), generator=gen, dtype=torch.float64) + 0.1
+    particles = {"pos": pos, "mass": mass}
+
+    compute_fmm_forces(particles, order=orders[0], theta=theta)  # JIT warm-up
+    compute_direct_gravity(particles)
+    start = time.perf_counter()
+    reference = compute_direct_gravity(particles)
+    direct_time = time.perf_counter() - start
+    ref_norm = reference.norm(dim=1)
+
+    rows = []
+    print(f"FMM accuracy vs direct (N={n}, theta={theta}, direct {direct_time:.3f}s)")
+    print(f"{'order':>5} {'median':>10} {'p99':>10} {'max':>10} {'time':>8}")
+    for order in orders:
+        start = time.perf_counter()
+        forces = compute_fmm_forces(particles, order=order, theta=theta)
+        elapsed = time.perf_counter() - start
+        err = (forces - reference).norm(dim=1) / ref_norm
+        row = {
+            "order": order,
+            "median_error": err.median().item(),
+            "p99_error": err.quantile(0.99).item(),
+            "max_error": err.max().item(),
+            "time": elapsed,
+            "direct_time": direct_time,
+        }
+        rows.append(row)
+        print(f"{order:>5} {row['median_error']:>10.2e} {row['p99_error']:>10.2e} {row['max_error']:>10.2e} {elapsed:>7.3f}s")
+    return rows
+
+def run_direct_gravity_benchmark(sizes=(1000, 10000, 50000), dtype="float32", repeats=3, seed=0):
+    """
+    Pairs-per-second of the original direct Numba kernel next to the tiled one.
+    Args:
+        sizes (tuple): Particle counts to time.
+        dtype (str): Torch dtype name of the particle state.
+        repeats (int): Timed repetitions per kernel; the best one is reported.
+        seed (int): Random seed for positions and masses.
+    Returns:
+        list: One dict per (kernel, N) with seconds and pairs per second.
+    """
+    import time
+    import torch
+    from core.physics_engine.gravity import compute_direct_gravity, compute_direct_gravity_tiled
+
+    kernels = [("numba_direct", compute_direct_gravity), ("numba_tiled", compute_direct_gravity_tiled)]
+    torch_dtype = getattr(torch, dtype)
+    gen = torch.Generator().manual_seed(seed)
+    warm = {"pos": torch.randn((64, 3), dtype=torch_dtype), "mass": torch.rand((64, 1), dtype=torch_dtype)}
+    for _, fn in kernels:
+        fn(warm)  # JIT warm-up
+
+    rows = []
+    print(f"{'kernel':>14} {'N':>8} {'time':>10} {'pairs/s':>12}")
+    for n in sizes:
+        particles = {
+            "pos": torch.randn((n, 3), generator=gen, dtype=torch_dtype),
+            "mass": torch.rand((n, 1), generator=gen, dtype=torch_dtype),
+        }
+        # Both kernels account for all N(N-1) ordered pair interactions.
+        pairs = n * (n - 1)
+        for name, fn in kernels:
+            best = float("inf")
+            for _ in range(repeats):
+                start = time.perf_counter()
+                fn(particles)
+                best = min(best, time.perf_counter() - start)
+            rows.append({"kernel": name, "n": n, "dtype": dtype, "time": best, "pairs_per_second": pairs / best})
+            print(f"{name:>14} {n:>8} {best:>9.4f}s {pairs / best:>12.3e}")
+    return rows
+
+def run_integrator_energy_report(particles, config, steps=1000, methods=("euler", "verlet", "leapfrog", "yoshida4", "rk4", "block"), energy_budget=None):
+    """
+    Energy drift and force-evaluation cost of each integrator on the same initial state.
+    Args:
+        particles (dict): Initial particle state (left untouched).
+        config (dict): Simulation configuration (timestep, physics, interaction_model).
+        steps (int): Number of steps per integrator.
+        methods (tuple): Integrator names understood by get_integrator.
+        energy_budget (float, optional): Maximum allowed relative energy error;
+            the cheapest integrator within it is reported.
+    Returns:
+        list: One dict per integrator with max relative energy error, force
+        evaluations per step and wall time.
+    """
+    import time
+    from core.force_pipeline import build_force_pipeline
+    from core.time_stepper import get_integrator, integrate_step, ForceCounter
+    from core.physics_engine.gravity import compute_total_energy
+
+    rows = []
+    print(f"{'integrator':>10} {'evals/step':>10} {'max dE/E':>10} {'time':>8}")
+    for method in methods:
+        state = {k: v.clone() if hasattr(v, "clone") else v for k, v in particles.items()}
+        model_fn = ForceCounter(build_force_pipeline(config))
+        integrator = get_integrator(method)
+        e0 = compute_total_energy(state)
+        max_error = 0.0
+        start = time.perf_counter()
+        for _ in range(steps):
+            state = integrate_step(state, model_fn, integrator, config)
+            max_error = max(max_error, abs(compute_total_energy(state) - e0) / abs(e0))
+        elapsed = time.perf_counter() - start
+        evals_per_step = model_fn.particle_evaluations / (steps * max(state["pos"].shape[0], 1))
+        row = {"integrator": method, "evals_per_step": evals_per_step, "max_energy_error": max_error, "time": elapsed}
+        rows.append(row)
+        print(f"{method:>10} {row['evals_per_step']:>10.2f} {max_error:>10.2e} {elapsed:>7.3f}s")
+    if energy_budget is not None:
+        within = [r for r in rows if r["max_energy_error"] <= energy_budget]
+        if within:
+            best = min(within, key=lambda r: r["evals_per_step"])
+            print(f"Cheapest within dE/E <= {energy_budget:g}: {best['integrator']}")
+        else:
+            print(f"No integrator within dE/E <= {energy_budget:g}")
+    return rows
+
+BENCHMARK_OUTPUT = "benchmarks/results.json"
+BASELINE_PATH = "benchmarks/baseline.json"
+
+def _benchmark_cluster(n, dtype, seed):
+    """Deterministic Plummer-like cluster (unit sphere, unit-ish masses) for timing runs."""
+    import torch
+    gen = torch.Generator().manual_seed(seed)
+    pos = torch.randn((n, 3), generator=gen, dtype=torch.float64)
+    pos = pos / pos.norm(dim=1, keepdim=True) * torch.rand((n, 1), generator=gen, dtype=torch.float64) ** 2
+    vel = torch.randn((n, 3), generator=gen, dtype=torch.float64) * 1e-6
+    mass = torch.rand((n, 1), generator=gen, dtype=torch.float64) + 0.1
+    return {"pos": pos.to(dtype), "vel": vel.to(dtype), "mass": mass.to(dtype)}
 
-    logger = setup_logger()
-    config = CONFIG.copy()
-    logger.info("Starting benchmark...")
+def _peak_memory_mb(fn, interval=0.002):
+    """Run fn and return its peak memory above the starting point, in MB (RSS, or CUDA if in use)."""
+    import threading
+    import psutil
+    import torch
 
-    start_time = time.time()
-    sim = run_simulation(config)
+    process = psutil.Process()
+    start_rss = process.memory_info().rss
+    peak = [start_rss]
+    done = threading.Event()
 
-    for frame in range(100):
-        next(sim)
+    def sample():
+        while not done.wait(interval):
+            peak[0] = max(peak[0], process.memory_info().rss)
+
+    if torch.cuda.is_available():
+        torch.cuda.reset_peak_memory_stats()
+        cuda_start = torch.cuda.memory_allocated()
+    thread = threading.Thread(target=sample, daemon=True)
+    thread.start()
+    try:
+        fn()
+    finally:
+        done.set()
+        thread.join()
+    peak[0] = max(peak[0], process.memory_info().rss)
+    if torch.cuda.is_available() and torch.cuda.max_memory_allocated() > cuda_start:
+        return (torch.cuda.max_memory_allocated() - cuda_start) / (1024 * 1024)
+    return (peak[0] - start_rss) / (1024 * 1024)
+
+def _benchmark_environment():
+    import os
+    import platform
+    import time
+    import numba
+    import numpy as np
+    import torch
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numba_threads": numba.get_num_threads(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "torch": torch.__version__,
+        "numba": numba.__version__,
+        "cuda": torch.cuda.get_device_name(0) if torch.cuda.is_available() else None,
+    }
+
+def compare_to_baseline(rows, baseline, tolerance=0.10):
+    """
+    Mark every row whose median step time is more than tolerance slower than
+    the matching baseline row (same model, integrator, N and dtype).
+    Args:
+        rows (list): Results of run_benchmark_suite.
+        baseline (dict or str): Earlier results (or the path of their JSON file).
+        tolerance (float): Allowed relative slowdown.
+    Returns:
+        list: The rows that regressed.
+    """
+    import json
+    if isinstance(baseline, str):
+        with open(baseline) as f:
+            baseline = json.load(f)
+    key = lambda r: (r["interaction_model"], r["integration_method"], r["n"], r["dtype"])
+    reference = {key(r): r for r in baseline.get("results", [])}
+    regressions = []
+    for row in rows:
+        base = reference.get(key(row))
+        if base is None:
+            continue
+        row["baseline_median"] = base["median"]
+        row["speedup"] = base["median"] / row["median"]
+        row["regression"] = bool(row["median"] > base["median"] * (1 + tolerance))
+        if row["regression"]:
+            regressions.append(row)
+    return regressions
+
+# Runs in a fresh interpreter: imports, engine construction (including the
+# JIT warm-up) and the first two steps, each timed separately.
+_COLD_START_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from core.simulation import Simulation
+imported = time.perf_counter()
+sim = Simulation(json.loads(sys.argv[1]))
+built = time.perf_counter()
+sim.step()
+first = time.perf_counter()
+sim.step()
+second = time.perf_counter()
+print(json.dumps({"import": imported - start, "construct": built - imported,
+                  "first_step": first - built, "second_step": second - first}))
+"""
+
+def clear_jit_cache(root="."):
+    """Delete Numba's on-disk kernel cache (*.nbi / *.nbc next to the sources)."""
+    import glob
+    import os
+    removed = 0
+    for pattern in ("*.nbi", "*.nbc"):
+        for path in glob.glob(os.path.join(root, "**", "__pycache__", pattern), recursive=True):
+            os.remove(path)
+            removed += 1
+    return removed
+
+def measure_cold_start(config=None, runs=2, clear_cache=False):
+    """
+    Wall time from launching a fresh interpreter to the first simulated step.
+    Every run is a new process, so the first one after clear_cache pays the
+    full JIT compilation and later ones load the kernels from the disk cache.
+    Args:
+        config (dict, optional): Simulation configuration; CONFIG by default.
+        runs (int): Number of fresh processes.
+        clear_cache (bool): Delete the kernel cache before the first run.
+    Returns:
+        list: One dict per run with import, construct, first_step, second_step
+        and total (process launch to end of the first step) in seconds.
+    """
+    import json
+    import os
+    import subprocess
+    import sys
+    import time
+    from config import CONFIG
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    config = dict(CONFIG if config is None else config, step_log=None)
+    if clear_cache:
+        clear_jit_cache(root)
+    rows = []
+    print(f"{'run':>4} {'import':>8} {'build':>8} {'1st step':>9} {'2nd step':>9} {'total':>8}")
+    for run in range(runs):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", _COLD_START_SCRIPT, json.dumps(config)],
+                             cwd=root, capture_output=True, text=True, check=True)
+        wall = time.perf_counter() - start
+        row = json.loads(out.stdout.strip().splitlines()[-1])
+        # Interpreter startup plus everything up to the end of the first step.
+        row["total"] = wall - row["second_step"]
+        rows.append(row)
+        print(f"{run:>4} {row['import']:>7.2f}s {row['construct']:>7.2f}s {row['first_step']:>8.3f}s "
+              f"{row['second_step']:>8.3f}s {row['total']:>7.2f}s")
+    return rows
+
+def run_benchmark_suite(models=("direct", "direct_tiled", "barnes_hut", "barnes_hut_group", "fmm"),
+                        integrators=("leapfrog",), sizes=(1000, 10000), dtypes=("float32",),
+                        steps=3, warmup=2, repeats=5, seed=0, output=BENCHMARK_OUTPUT,
+                        baseline=None, tolerance=0.10, physics=None, cold_start=True):
+    """
+    Headless benchmark over interaction_model x integration_method x particle_count x dtype.
+    Each case is warmed up first (Numba JIT, caches) and then timed repeats
+    times over steps steps; the median and interquartile range of the step
+    time are reported with the direct-sum equivalent interaction rate
+    (N (N - 1) pairs per full force evaluation) and the peak memory of one
+    extra, untimed run.
+    Args:
+        models, integrators, sizes, dtypes (tuple): Grid to run.
+        steps (int): Steps per timed repetition.
+        warmup (int): Untimed steps before timing.
+        repeats (int): Timed repetitions per case.
+        seed (int): Seed of the test cluster.
+        output (str, optional): JSON file for the results.
+        baseline (str or dict, optional): Earlier results to compare against.
+        tolerance (float): Relative slowdown that counts as a regression.
+        physics (dict, optional): config["physics"]; gravity only by default.
+        cold_start (bool): Also measure launch-to-first-step latency (measure_cold_start).
+    Returns:
+        dict: {"environment": ..., "results": [...], "regressions": [...], "cold_start": [...]}
+    """
+    import json
+    import os
+    import time
+    import numpy as np
+    import torch
+    from core.simulation import Simulation
 
-    end_time = time.time()
-    fps = 100 / (end_time - start_time)
-    logger.info(f"Average FPS over 100 frames: {fps:.2f}")
+    rows = []
+    print(f"{'model':>16} {'integrator':>10} {'N':>8} {'dtype':>8} {'median':>10} {'IQR':>9} {'inter/s':>10} {'peak MB':>8}")
+    for model in models:
+        for method in integrators:
+            for n in sizes:
+                for dtype in dtypes:
+                    config = {
+                        "interaction_model": model,
+                        "integration_method": method,
+                        "physics": physics or {"gravity": True},
+                        "timestep": 0.01,
+                    }
+                    particles = _benchmark_cluster(n, getattr(torch, dtype), seed)
+                    sim = Simulation(config, {k: v.clone() for k, v in particles.items()})
+                    sim.step(warmup)
+                    times = []
+                    evaluations = sim.model_fn.particle_evaluations
+                    for _ in range(repeats):
+                        start = time.perf_counter()
+                        sim.step(steps)
+                        times.append((time.perf_counter() - start) / steps)
+                    evals_per_step = (sim.model_fn.particle_evaluations - evaluations) / (repeats * steps * n)
+                    peak = _peak_memory_mb(lambda: sim.step(steps))
+                    q25, median, q75 = np.percentile(times, [25, 50, 75])
+                    row = {
+                        "interaction_model": model,
+                        "integration_method": method,
+                        "n": n,
+                        "dtype": dtype,
+                        "median": median,
+                        "iqr": q75 - q25,
+                        "min": min(times),
+                        "evals_per_step": evals_per_step,
+                        "interactions_per_second": evals_per_step * n * (n - 1) / median,
+                        "peak_memory_mb": peak,
+                    }
+                    rows.append(row)
+                    print(f"{model:>16} {method:>10} {n:>8} {dtype:>8} {median:>9.4f}s {q75 - q25:>8.4f}s "
+                          f"{row['interactions_per_second']:>10.3e} {peak:>8.1f}")
 
-def run_benchmarks(simulation_fn, presets):
-    # Placeholder: In real use, would run simulation with different presets and log results
-    print("Running benchmarks... (placeholder)")
+    regressions = []
+    if baseline is not None:
+        regressions = compare_to_baseline(rows, baseline, tolerance)
+        for row in rows:
+            if "speedup" in row:
+                flag = "REGRESSION" if row["regression"] else "ok"
+                print(f"{row['interaction_model']:>16} {row['integration_method']:>10} {row['n']:>8} {row['dtype']:>8} "
+                      f"x{row['speedup']:.2f} vs baseline {flag}")
+    results = {"environment": _benchmark_environment(), "results": rows, "regressions": regressions}
+    if cold_start:
+        results["cold_start"] = measure_cold_start()
+    if output:
+        directory = os.path.dirname(output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
@@ -0,0 +1,196 @@
+import glob
+import json
+import os
+import random
+import numpy as np
+
+# File layout: MAGIC, the header length (uint64, little endian), the JSON
+# header, then every array's raw bytes starting at a multiple of ALIGN.
+# The header lists each array's kind, dtype, shape and offset, so loading is
+# one memory map plus views into it.
+MAGIC = b"PYVCKPT1"
+ALIGN = 64
+CHECKPOINT_DIR = "checkpoints"
+
+def _pad(offset):
+    return -offset % ALIGN
+
+def _plain(value):
+    """value if it survives JSON, else None."""
+    try:
+        json.dumps(value)
+        return value
+    except (TypeError, ValueError):
+        return None
+
+def capture_rng_state():
+    """RNG states of torch (CPU and CUDA), NumPy's global generator and random."""
+    import torch
+    name, keys, pos, has_gauss, cached = np.random.get_state()
+    state = {
+        "arrays": {"torch": torch.get_rng_state().numpy(), "numpy": keys},
+        "numpy": [name, int(pos), int(has_gauss), float(cached)],
+        "python": random.getstate(),
+    }
+    if torch.cuda.is_available():
+        for i, cuda_state in enumerate(torch.cuda.get_rng_state_all()):
+            state["arrays"][f"cuda{i}"] = cuda_state.numpy()
+    return state
+
+def restore_rng_state(state):
+    import torch
+    arrays = state["arrays"]
+    torch.set_rng_state(torch.from_numpy(np.array(arrays["torch"])))
+    name, pos, has_gauss, cached = state["numpy"]
+    np.random.set_state((name, np.array(arrays["numpy"]), pos, has_gauss, cached))
+    version, internal, gauss = state["python"]
+    random.setstate((version, tuple(internal), gauss))
+    cuda = [torch.from_numpy(np.array(arrays[f"cuda{i}"])) for i in range(torch.cuda.device_count()) if f"cuda{i}" in arrays]
+    if cuda:
+        torch.cuda.set_rng_state_all(cuda)
+
+def _entries(particles, rng):
+    """(name, kind, numpy array) for everything stored as raw bytes, plus the JSON-able extras."""
+    import torch
+    count = particles.count if hasattr(particles, "count") else particles["pos"].shape[0]
+    entries = []
+    extra = {}
+    for key, value in particles.items():
+        if isinstance(value, torch.Tensor):
+            # CPU tensors are written from their own memory; CUDA ones are copied once.
+            entries.append((key, "tensor", value.detach().cpu().contiguous().numpy()))
+        elif isinstance(value, np.ndarray) and value.dtype == object:
+            # names: one UTF-8 line per particle
+            text = "\n".join(str(v) for v in value).encode("utf-8")
+            entries.append((key, "lines", np.frombuffer(text, dtype=np.uint8)))
+        elif isinstance(value, np.ndarray):
+            entries.append((key, "array", np.ascontiguousarray(value)))
+        elif _plain(value) is not None:
+            extra[key] = value
+    for key, value in rng["arrays"].items():
+        entries.append((key, "rng", np.ascontiguousarray(value)))
+    return count, entries, extra
+
+def save_checkpoint(path, particles, step, time, config, fsync=True):
+    """
+    Atomically write the full simulation state: every particle field
+    (including integrator history such as prev_pos, next_forces and dt_bin),
+    step counter, simulated time, RNG states and config. The data goes to a
+    temporary file that replaces path only once it is complete, so a crash
+    mid-write leaves the previous checkpoint intact.
+    Returns:
+        str: path.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    rng = capture_rng_state()
+    count, entries, extra = _entries(particles, rng)
+    offset = 0
+    arrays = []
+    for name, kind, array in entries:
+        offset += _pad(offset)
+        arrays.append({"name": name, "kind": kind, "dtype": array.dtype.str, "shape": list(array.shape), "offset": offset})
+        offset += array.nbytes
+    header = json.dumps({
+        "step": step,
+        "time": time,
+        "count": count,
+        "config": {k: v for k, v in config.items() if _plain(v) is not None},
+        "rng": {"numpy": rng["numpy"], "python": rng["python"]},
+        "extra": extra,
+        "arrays": arrays,
+    }).encode("utf-8")
+    start = len(MAGIC) + 8 + len(header)
+    start += _pad(start)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header)
+        position = len(MAGIC) + 8 + len(header)
+        for entry, (_, _, array) in zip(arrays, entries):
+            f.write(b"\0" * (start + entry["offset"] - position))
+            f.write(memoryview(array.reshape(-1)).cast("B"))
+            position = start + entry["offset"] + array.nbytes
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return path
+
+def read_header(path):
+    """Header dict of a checkpoint and the file offset of its data section."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a PyVerse checkpoint")
+        size = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+        header = json.loads(f.read(size))
+    start = len(MAGIC) + 8 + size
+    return header, start + _pad(start)
+
+def load_checkpoint(path, device=None, restore_rng=True):
+    """
+    Load a checkpoint written by save_checkpoint. The file is memory-mapped
+    copy-on-write and the particle tensors are views into the mapping, so
+    nothing is read until it is used and nothing is copied (unless device
+    is a GPU).
+    Returns:
+        dict: particles (ParticleStore), step, time and config.
+    """
+    import torch
+    from core.particle_store import ParticleStore
+
+    header, start = read_header(path)
+    data = np.memmap(path, dtype=np.uint8, mode="c")
+    fields = {}
+    extra = dict(header["extra"])
+    rng_arrays = {}
+    for entry in header["arrays"]:
+        dtype = np.dtype(entry["dtype"])
+        offset = start + entry["offset"]
+        nbytes = int(np.prod(entry["shape"], dtype=np.int64)) * dtype.itemsize
+        array = np.asarray(data[offset:offset + nbytes]).view(dtype).reshape(entry["shape"])
+        name = entry["name"]
+        if entry["kind"] == "rng":
+            rng_arrays[name] = array
+            continue
+        if entry["kind"] == "tensor":
+            value = torch.from_numpy(array)
+            if device is not None:
+                value = value.to(device)
+        elif entry["kind"] == "lines":
+            text = array.tobytes().decode("utf-8")
+            value = np.array(text.split("\n") if header["count"] else [], dtype=object)
+        else:
+            value = array
+        if value.shape[:1] == (header["count"],) and len(value.shape) > 0:
+            fields[name] = value
+        else:
+            extra[name] = value
+    if restore_rng:
+        restore_rng_state({"arrays": rng_arrays, **header["rng"]})
+    return {
+        "particles": ParticleStore.wrap(fields, extra),
+        "step": header["step"],
+        "time": header["time"],
+        "config": header["config"],
+    }
+
+def checkpoint_path(directory, step):
+    return os.path.join(directory, f"step_{step:09d}.ckpt")
+
+def latest_checkpoint(directory=CHECKPOINT_DIR):
+    """Newest complete checkpoint in directory, or None."""
+    paths = sorted(glob.glob(os.path.join(directory, "step_*.ckpt")))
+    return paths[-1] if paths else None
+
+def prune_checkpoints(directory, keep=3):
+    """Delete all but the newest keep checkpoints in directory; keep <= 0 keeps all of them."""
+    if keep <= 0:
+        return
+    for path in sorted(glob.glob(os.path.join(directory, "step_*.ckpt")))[:-keep]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # still mapped by a resumed run (Windows)
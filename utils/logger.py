@@ -1,11 +1,101 @@
 from loguru import logger
+import atexit
 import logging
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
 
 def setup_logger():
     logger.add("logs/performance_{time}.log", rotation="10 MB")
     logging.basicConfig(filename='simulation.log', level=logging.INFO)
     return logger
 
+class StepLog:
+    """
+    Structured per-step records written as JSON lines by a background thread.
+    The simulation only appends a dict to a deque (no formatting, no I/O, no
+    lock); every flush_interval seconds the writer drains whatever piled up
+    and writes it as one batch. Only every k-th step is recorded.
+    """
+
+    def __init__(self, path, every=1, flush_interval=0.5):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.every = max(int(every), 1)
+        self.flush_interval = flush_interval
+        self._pending = deque()
+        self._file = open(path, "a", encoding="utf-8")
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="step-log", daemon=True)
+        self._thread.start()
+
+    def wants(self, step):
+        return step % self.every == 0
+
+    def push(self, step, n, stats):
+        # Shallow copy: the caller may reuse its dict; the record is built by the writer.
+        self._pending.append((step, n, dict(stats)))
+
+    def _drain(self):
+        lines = []
+        encode = json.JSONEncoder(separators=(",", ":")).encode
+        while self._pending:
+            step, n, stats = self._pending.popleft()
+            record = {"step": step, "n": n}
+            # inf/nan are not JSON; a diverged value is written as null.
+            record.update((k, None if isinstance(v, float) and not math.isfinite(v) else v) for k, v in stats.items())
+            lines.append(encode(record))
+        if lines:
+            self._file.write("\n".join(lines) + "\n")
+            self._file.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self._drain()
+
+    def close(self):
+        """Stop the writer and flush everything still queued."""
+        self._stop.set()
+        self._thread.join()
+        self._drain()
+        self._file.close()
+
+_STEP_LOG = None
+
+def start_step_log(path=None, every=1, flush_interval=0.5):
+    """
+    Send log_simulation_step records to a JSONL file (logs/steps_<time>.jsonl
+    by default). Simulation.close() stops it; records still queued at
+    interpreter exit are flushed as well.
+    """
+    global _STEP_LOG
+    stop_step_log()
+    if path is None:
+        path = os.path.join("logs", f"steps_{int(time.time())}.jsonl")
+    _STEP_LOG = StepLog(path, every, flush_interval)
+    return _STEP_LOG
+
+@atexit.register
+def stop_step_log():
+    """Stop the step log, writing every queued record."""
+    global _STEP_LOG
+    if _STEP_LOG is not None:
+        _STEP_LOG.close()
+        _STEP_LOG = None
+
+def step_log_wants(step):
+    """True if a record for this step would be kept."""
+    return _STEP_LOG is not None and _STEP_LOG.wants(step)
+
 def log_simulation_step(step, particles, stats):
-    msg = f"Step {step}: Particles={particles['pos'].shape[0]}, CPU={stats.get('cpu', 0):.1f}%, RAM={stats.get('ram', 0):.1f}%, GPU={stats.get('gpu', 0):.1f}%"
-    logging.info(msg)
\ No newline at end of file
+    """Queue a structured record of the step; a no-op unless a step log is running."""
+    log = _STEP_LOG
+    if log is None or step % log.every:
+        return
+    n = particles.count if hasattr(particles, "count") else particles["pos"].shape[0]
+    log.push(step, n, stats)
@@ -1,3 +1,117 @@
-def run_stress_test(simulation_fn, config):
-    # Placeholder: In real use, would gradually increase load and monitor system
-    print("Running stress test... (placeholder)")
\ No newline at end of file
+# Physics modules switched on cumulatively when run_stress_test is asked to
+# ramp physics as well as particle count.
+PHYSICS_LEVELS = (
+    {"gravity": True},
+    {"gravity": True, "dark_matter": True},
+    {"gravity": True, "dark_matter": True, "electromagnetism": True},
+    {"gravity": True, "dark_matter": True, "electromagnetism": True, "fluid_dynamics": True},
+)
+
+def _preset_bodies(preset):
+    """Bodies and arrays of a preset, without generated particles (empty if the preset is unknown)."""
+    from core.presets import load_preset
+    return load_preset(preset, particle_count=0)
+
+def _field_particles(k, radius, gen):
+    """k light test particles spread over a sphere of the given radius."""
+    import torch
+    pos = torch.randn((k, 3), generator=gen)
+    pos = pos / pos.norm(dim=1, keepdim=True) * radius * torch.rand((k, 1), generator=gen) ** (1 / 3)
+    return {
+        "pos": pos,
+        "vel": torch.randn((k, 3), generator=gen) * 1e-3 * radius,
+        "mass": torch.rand((k, 1), generator=gen) * 1e20 + 1e18,
+        "charge": torch.randn((k, 1), generator=gen) * 1e-9,
+    }
+
+def _measure(sim, steps, budget):
+    """Mean step time, process CPU% and RSS over up to steps steps (stops early when far over budget)."""
+    import time
+    import psutil
+    process = psutil.Process()
+    process.cpu_percent()
+    times = []
+    for _ in range(steps):
+        start = time.perf_counter()
+        sim.step()
+        times.append(time.perf_counter() - start)
+        if sum(times) > 5 * budget * steps:
+            break
+    cpu = process.cpu_percent() / (psutil.cpu_count() or 1)
+    return sum(times) / len(times), cpu, process.memory_info().rss / (1024 * 1024)
+
+def run_stress_test(config=None, models=("direct", "barnes_hut", "barnes_hut_group", "fmm"),
+                    target_steps_per_second=30.0, start_n=1000, growth=2.0, max_n=4_000_000,
+                    steps=5, preset=None, ramp_physics=False, seed=0, min_free_memory=0.1):
+    """
+    Capacity test: for every interaction model, grow the particle count
+    geometrically from start_n (on top of the bodies of preset, if given) and
+    measure step time, process CPU utilisation and RSS at every size until
+    the model can no longer sustain target_steps_per_second.
+    Args:
+        config (dict, optional): Base configuration (integrator, timestep, preset).
+        models (tuple): Interaction models to test.
+        target_steps_per_second (float): Required sustained step rate.
+        start_n (int): First particle count.
+        growth (float): Factor between particle counts.
+        max_n (int): Upper limit of the ramp.
+        steps (int): Steps measured per size after one warm-up step.
+        preset (str, optional): Preset whose bodies seed the system; config["preset"] by default.
+        ramp_physics (bool): Repeat the ramp for each level of PHYSICS_LEVELS.
+        seed (int): Seed of the added particles.
+        min_free_memory (float): Stop when less than this fraction of RAM is available.
+    Returns:
+        dict: "capacity" maps (model, physics level) to the largest sustained N
+        (0 if even start_n is too slow); "measurements" lists every size tried.
+    """
+    import psutil
+    import torch
+    from core.simulation import Simulation
+
+    config = dict(config or {})
+    preset = preset or config.get("preset")
+    budget = 1.0 / target_steps_per_second
+    levels = PHYSICS_LEVELS if ramp_physics else (config.get("physics") or PHYSICS_LEVELS[0],)
+    measurements = []
+    capacity = {}
+    print(f"Stress test: target {target_steps_per_second:g} steps/s ({budget * 1e3:.1f} ms/step)")
+    print(f"{'model':>16} {'physics':>8} {'N':>9} {'step ms':>9} {'steps/s':>8} {'CPU %':>6} {'RSS MB':>8}")
+    for level, physics in enumerate(levels):
+        for model in models:
+            run_config = dict(config, interaction_model=model, physics=dict(physics))
+            run_config.setdefault("integration_method", "leapfrog")
+            # The bodies are passed in; without a preset its physics switches cannot override the ramp.
+            run_config.pop("preset", None)
+            bodies = _preset_bodies(preset)
+            # Spread the added particles over the preset's extent (1 AU-ish if empty).
+            radius = float(bodies["pos"].norm(dim=1).max()) if bodies["pos"].shape[0] else 1.5e11
+            sim = Simulation(run_config, bodies)
+            gen = torch.Generator().manual_seed(seed)
+            best = 0
+            target_n = max(int(start_n), 1)
+            while target_n <= max_n:
+                if psutil.virtual_memory().available < min_free_memory * psutil.virtual_memory().total:
+                    print("Stopping: low memory")
+                    break
+                if target_n > sim.num_particles:
+                    added = _field_particles(target_n - sim.num_particles, radius, gen)
+                    sim.add_many(added["pos"], added["vel"], added["mass"], charge=added["charge"])
+                sim.step()  # warm-up (JIT, buffers)
+                step_time, cpu, rss = _measure(sim, steps, budget)
+                ok = step_time <= budget
+                measurements.append({
+                    "interaction_model": model, "physics_level": level, "n": sim.num_particles,
+                    "step_time": step_time, "steps_per_second": 1.0 / step_time,
+                    "cpu_percent": cpu, "rss_mb": rss, "sustained": ok,
+                })
+                print(f"{model:>16} {level:>8} {sim.num_particles:>9} {step_time * 1e3:>9.2f} "
+                      f"{1.0 / step_time:>8.1f} {cpu:>6.0f} {rss:>8.0f}{'' if ok else '  <- over budget'}")
+                if not ok:
+                    break
+                best = sim.num_particles
+                target_n = int(target_n * growth)
+            capacity[(model, level)] = best
+    print("Largest N sustaining the target:")
+    for (model, level), n in capacity.items():
+        print(f"  {model:>16} physics level {level}: {n}")
+    return {"capacity": capacity, "measurements": measurements}
@@ -1,15 +1,95 @@
+import os
+import time
+import threading
+from collections import deque
 import psutil
-try:
-    import GPUtil
-except ImportError:
-    GPUtil = None
+
+# GPUtil is imported on the first sample; None until then, False if missing.
+GPUtil = None
+
+DEFAULT_INTERVAL = 0.5
+DEFAULT_HISTORY = 240
+
+def _gputil():
+    global GPUtil
+    if GPUtil is None:
+        try:
+            import GPUtil as module
+            GPUtil = module
+        except ImportError:
+            GPUtil = False
+    return GPUtil
 
 def get_system_stats():
     cpu = psutil.cpu_percent()
     ram = psutil.virtual_memory().percent
     gpu = 0.0
-    if GPUtil:
+    if _gputil():
         gpus = GPUtil.getGPUs()
         if gpus:
             gpu = gpus[0].load * 100
     return {"cpu": cpu, "ram": ram, "gpu": gpu}
+
+class SystemMonitor:
+    """
+    Polls system and process stats on a daemon thread every interval seconds
+    and keeps the last history samples in a ring buffer. Readers get the
+    latest sample without touching psutil or spawning nvidia-smi themselves.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, history=DEFAULT_HISTORY):
+        self.interval = interval
+        self.samples = deque(maxlen=history)
+        self._process = psutil.Process(os.getpid())
+        self._stop = threading.Event()
+        self._thread = None
+        self._latest = self.sample()
+
+    def sample(self):
+        """Take one sample: system CPU/RAM/GPU plus this process's RSS and thread count."""
+        stats = get_system_stats()
+        with self._process.oneshot():
+            stats["rss_mb"] = self._process.memory_info().rss / (1024 * 1024)
+            stats["threads"] = self._process.num_threads()
+        stats["time"] = time.time()
+        self.samples.append(stats)
+        self._latest = stats
+        return stats
+
+    def latest(self):
+        """Most recent sample (a copy, so callers may add their own keys)."""
+        return dict(self._latest)
+
+    def history(self):
+        return list(self.samples)
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="system-monitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+_MONITOR = None
+
+def get_monitor(interval=DEFAULT_INTERVAL):
+    """Shared background monitor, started on first use."""
+    global _MONITOR
+    if _MONITOR is None:
+        _MONITOR = SystemMonitor(interval).start()
+    _MONITOR.interval = interval
+    return _MONITOR
+
+def get_latest_stats(interval=DEFAULT_INTERVAL):
+    """Latest sample of the shared monitor; cheap enough to call every step."""
+    return get_monitor(interval).latest()
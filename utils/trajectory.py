@@ -0,0 +1,261 @@
+import json
+import os
+import queue
+import threading
+import numpy as np
+
+# On-disk layout of a trajectory directory:
+#   meta.json        format version, stored fields and dtype, downsampling
+#   index.bin        one INDEX record per frame, appended after its data
+#   chunk_00000.bin  raw frames back to back, field after field (n x 3 each);
+#                    a new chunk is started once chunk_bytes would be exceeded
+# Frames are only ever appended, with increasing steps, so a reader can follow
+# a run while it is being written, never sees a frame whose data is not on
+# disk yet and can binary-search the steps.
+TRAJECTORY_VERSION = 1
+CHUNK_BYTES = 256 * 1024 * 1024
+TRAJECTORY_DIR = "trajectories"
+
+def _index_dtype(fields):
+    columns = [("step", "<i8"), ("time", "<f8"), ("count", "<i8"), ("n", "<i8"), ("chunk", "<i4"), ("offset", "<i8")]
+    return np.dtype(columns + [(f"scale_{field}", "<f4") for field in fields])
+
+def _as_numpy(value):
+    if hasattr(value, "detach"):
+        value = value.detach().cpu().numpy()
+    return np.asarray(value)
+
+class TrajectoryWriter:
+    """
+    Streams per-step particle fields into a chunked trajectory directory.
+    push() copies the (downsampled) rows and hands them to a writer thread
+    through a bounded queue; when the disk cannot keep up, push() blocks
+    instead of letting the backlog grow without limit.
+    With dtype="float16" every field is divided by its largest absolute value
+    in that frame before quantizing (the scale goes into the index), so
+    positions in metres do not overflow and keep ~1e-3 relative precision.
+    """
+
+    def __init__(self, path, fields=("pos", "vel"), every=1, stride=1, dtype="float32",
+                 chunk_bytes=CHUNK_BYTES, max_pending=32):
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, "index.bin")):
+            raise FileExistsError(f"{path} already holds a trajectory")
+        self.path = path
+        self.fields = tuple(fields)
+        self.every = max(int(every), 1)
+        self.stride = max(int(stride), 1)
+        self.dtype = np.dtype(dtype)
+        self.chunk_bytes = chunk_bytes
+        self.index_dtype = _index_dtype(self.fields)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({
+                "version": TRAJECTORY_VERSION,
+                "fields": list(self.fields),
+                "dtype": self.dtype.str,
+                "every": self.every,
+                "stride": self.stride,
+            }, f, indent=2)
+        self._index = open(os.path.join(path, "index.bin"), "ab")
+        self._chunk = -1
+        self._chunk_file = None
+        self._chunk_size = 0
+        self.frames = 0
+        self.last_step = None
+        self.error = None
+        self._queue = queue.Queue(max_pending)
+        self._thread = threading.Thread(target=self._run, name="trajectory-writer", daemon=True)
+        self._thread.start()
+
+    def wants(self, step):
+        return step % self.every == 0
+
+    def push(self, step, time, particles):
+        """Queue one frame of particles (any mapping of field -> tensor/array); steps must increase."""
+        if self.error is not None:
+            raise self.error
+        if self.last_step is not None and step <= self.last_step:
+            raise ValueError(f"step {step} after step {self.last_step}; start a new trajectory when steps restart")
+        self.last_step = step
+        count = particles.count if hasattr(particles, "count") else particles["pos"].shape[0]
+        # Copy now: the engine updates its buffers in place on the next step.
+        arrays = [np.array(_as_numpy(particles[field][:count:self.stride])) for field in self.fields]
+        self._queue.put((step, time, count, arrays))
+
+    def _open_chunk(self):
+        if self._chunk_file is not None:
+            self._chunk_file.close()
+        self._chunk += 1
+        self._chunk_file = open(os.path.join(self.path, f"chunk_{self._chunk:05d}.bin"), "wb")
+        self._chunk_size = 0
+
+    def _write(self, step, time, count, arrays):
+        record = np.zeros(1, dtype=self.index_dtype)
+        blocks = []
+        for field, array in zip(self.fields, arrays):
+            scale = 1.0
+            if self.dtype == np.float16:
+                scale = float(np.abs(array).max()) if array.size else 1.0
+                scale = scale if np.isfinite(scale) and scale > 0 else 1.0
+                array = array / scale
+            blocks.append(np.ascontiguousarray(array, dtype=self.dtype))
+            record[f"scale_{field}"] = scale
+        nbytes = sum(block.nbytes for block in blocks)
+        if self._chunk_file is None or (self._chunk_size and self._chunk_size + nbytes > self.chunk_bytes):
+            self._open_chunk()
+        for block in blocks:
+            self._chunk_file.write(block.tobytes())
+        # Data first, then the index record that points at it.
+        self._chunk_file.flush()
+        record["step"], record["time"], record["count"] = step, time, count
+        record["n"] = arrays[0].shape[0] if arrays else 0
+        record["chunk"], record["offset"] = self._chunk, self._chunk_size
+        self._index.write(record.tobytes())
+        self._index.flush()
+        self._chunk_size += nbytes
+        self.frames += 1
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self.error is None:
+                try:
+                    self._write(*item)
+                except Exception as exc:  # surfaced on the next push()
+                    self.error = exc
+
+    def close(self):
+        """Write everything still queued and close the files."""
+        self._queue.put(None)
+        self._thread.join()
+        if self._chunk_file is not None:
+            self._chunk_file.close()
+        self._index.close()
+
+class TrajectoryReader:
+    """
+    Random access to a trajectory directory through memory maps: reading a
+    frame, a field or a subset of particles only touches those bytes, so
+    trajectories far larger than RAM can be replayed and analysed.
+    Frames are addressed by position (0..len-1); frame_of(step) maps a
+    simulation step to it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.fields = tuple(self.meta["fields"])
+        self.dtype = np.dtype(self.meta["dtype"])
+        self.index_dtype = _index_dtype(self.fields)
+        self._maps = {}
+        # read() may run on a prefetch thread and the UI thread at once.
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """Pick up frames appended since the reader was opened (for a run still being recorded)."""
+        index_path = os.path.join(self.path, "index.bin")
+        frames = os.path.getsize(index_path) // self.index_dtype.itemsize
+        self.index = np.fromfile(index_path, dtype=self.index_dtype, count=frames)
+        return len(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def steps(self):
+        return self.index["step"]
+
+    @property
+    def times(self):
+        return self.index["time"]
+
+    def frame_of(self, step):
+        """Frame holding the given simulation step (KeyError if it was not recorded)."""
+        i = int(np.searchsorted(self.index["step"], step))
+        if i == len(self.index) or self.index["step"][i] != step:
+            raise KeyError(f"step {step} is not in the trajectory")
+        return i
+
+    def _chunk(self, chunk, end):
+        with self._lock:
+            mapped = self._maps.get(chunk)
+            if mapped is None or mapped.size < end:
+                # (Re)map: the last chunk grows while a run is being recorded.
+                mapped = np.memmap(os.path.join(self.path, f"chunk_{chunk:05d}.bin"), dtype=np.uint8, mode="r")
+                self._maps[chunk] = mapped
+            return mapped
+
+    def view(self, frame, field="pos"):
+        """
+        Zero-copy (n, 3) view of one field in the stored dtype, before the
+        float16 scale is applied (multiply by scale(frame, field)).
+        """
+        record = self.index[frame]
+        n = int(record["n"])
+        block = n * 3 * self.dtype.itemsize
+        if block == 0:
+            return np.empty((0, 3), dtype=self.dtype)
+        start = int(record["offset"]) + self.fields.index(field) * block
+        data = self._chunk(int(record["chunk"]), start + block)
+        return data[start:start + block].view(self.dtype).reshape(n, 3)
+
+    def scale(self, frame, field="pos"):
+        return float(self.index[frame][f"scale_{field}"])
+
+    def read(self, frame, fields=None, particles=None, dtype=np.float32):
+        """
+        Load one frame.
+        Args:
+            frame (int): Frame position; negative values count from the end.
+            fields (tuple, optional): Fields to load; all recorded fields by default.
+            particles (slice or array, optional): Rows to load (indices of the
+                recorded, i.e. already strided, particles).
+            dtype: Result dtype.
+        Returns:
+            dict: field -> (k, 3) array, plus "step", "time" and "count".
+        """
+        frame = range(len(self.index))[frame]
+        record = self.index[frame]
+        out = {"step": int(record["step"]), "time": float(record["time"]), "count": int(record["count"])}
+        for field in fields or self.fields:
+            data = self.view(frame, field)
+            if particles is not None:
+                data = data[particles]
+            out[field] = np.asarray(data, dtype=dtype) * np.dtype(dtype).type(self.scale(frame, field))
+        return out
+
+    def __getitem__(self, frame):
+        return self.read(frame)
+
+    def __iter__(self):
+        for frame in range(len(self.index)):
+            yield self.read(frame)
+
+    def track(self, particles, field="pos", start=0, stop=None, every=1, dtype=np.float32):
+        """(frames, k, 3) history of the given particles, read frame by frame from the maps."""
+        frames = range(len(self.index))[start:stop:every]
+        first = self.view(frames[0], field)[particles] if len(frames) else np.empty((0, 3))
+        out = np.empty((len(frames),) + first.shape, dtype=dtype)
+        for i, frame in enumerate(frames):
+            out[i] = self.view(frame, field)[particles] * self.scale(frame, field)
+        return out
+
+    def close(self):
+        with self._lock:
+            self._maps.clear()
+
+def unused_trajectory_path(path):
+    """path, or path with a _<k> suffix before its extension if it is already in use."""
+    root, ext = os.path.splitext(path)
+    k = 1
+    while os.path.exists(path):
+        path, k = f"{root}_{k}{ext}", k + 1
+    return path
+
+def default_trajectory_path():
+    import time
+    return unused_trajectory_path(os.path.join(TRAJECTORY_DIR, f"run_{time.strftime('%Y%m%d_%H%M%S')}.traj"))